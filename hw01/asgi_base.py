@@ -1,73 +1,212 @@
-import json
+import inspect
 from http import HTTPStatus
-from typing import Callable, Awaitable, Any
+from typing import Callable, Awaitable, Any, AsyncIterator, Iterable, Iterator
 
-class ASGIServerBase:
-    """
-    A base class for creating ASGI applications.
+from compression import ENCODERS, negotiate_encoding
+from routing import ROUTES_ATTRIBUTE, Handler, Router
+from serializers import JSONSerializer, default_serializer
 
-    Responsibilities:
-    -----------------
-    - Handles ASGI lifecycle by processing incoming HTTP requests.
-    - Provides utility methods for handling JSON request bodies and sending JSON responses.
+Scope = dict[str, Any]
+Receive = Callable[[], Awaitable[dict[str, Any]]]
+Send = Callable[[dict[str, Any]], Awaitable[None]]
+Hook = Callable[[], Awaitable[None] | None]
+
+# Upper bound for request bodies unless a subclass says otherwise
+DEFAULT_MAX_BODY_SIZE: int = 32 * 1024 * 1024
+# Responses smaller than this are not worth compressing
+DEFAULT_COMPRESSION_MIN_SIZE: int = 1024
+# Maximum size of a single `http.response.body` message
+DEFAULT_RESPONSE_CHUNK_SIZE: int = 64 * 1024
+
+
+class PayloadTooLarge(Exception):
+    """Raised when a request body exceeds the configured maximum size."""
+
+
+class Request:
     """
-    def __init__(self):
-        self.scope: dict[str, Any] = None
-        self.receive: Callable[[], Awaitable[dict[str, Any]]] = None
-        self.send: Callable[[dict[str, Any]], Awaitable[None]] = None
+    A single HTTP request: its scope, receive and send channels.
 
-    async def __call__(
-        self,
-        scope: dict[str, Any],
-        receive: Callable[[], Awaitable[dict[str, Any]]],
-        send: Callable[[dict[str, Any]], Awaitable[None]]
-    ) -> None:
+    A new instance is created for every ASGI call and passed to the handler,
+    so interleaved requests never see each other's state. Also provides the
+    utility methods for reading request bodies and sending responses.
+    """
+    def __init__(self, app: "ASGIServerBase", scope: Scope, receive: Receive, send: Send):
+        self.app = app
         self.scope = scope
         self.receive = receive
         self.send = send
-        if scope['type'] == 'http':
-            await self.handle_request()
-        else:
-            await self.default_response()
 
-    async def handle_request(self) -> None:
-        """Override this method to define route-specific logic."""
-        raise NotImplementedError("Subclasses must implement this method.")
+    @property
+    def path(self) -> str:
+        return self.scope["path"]
 
-    async def receive_body(self) -> dict[str, Any] | None:
-        """Handles receiving the body from an incoming request."""
-        body: bytes = b""
+    @property
+    def method(self) -> str:
+        return self.scope["method"]
+
+    def header(self, name: bytes) -> bytes | None:
+        """Return the value of a request header, `name` must be lowercase."""
+        for header_name, value in self.scope.get("headers", []):
+            if header_name == name:
+                return value
+        return None
+
+    def content_length(self) -> int | None:
+        """Return the declared Content-Length of the request, if any."""
+        value = self.header(b"content-length")
+        try:
+            return int(value) if value is not None else None
+        except ValueError:
+            return None
+
+    def response_encoding(self) -> str | None:
+        """Content coding to compress the response with, None to send it as is."""
+        if self.app.compression_min_size is None:
+            return None
+        accept_encoding = self.header(b"accept-encoding")
+        if not accept_encoding:
+            return None
+        return negotiate_encoding(accept_encoding.decode("latin-1"))
+
+    async def iter_body(self) -> AsyncIterator[bytes]:
+        """
+        Yield the request body chunk by chunk as `http.request` messages arrive.
+
+        Raises `PayloadTooLarge` as soon as the declared or received size
+        exceeds the app's `max_body_size`, so oversize bodies are never buffered.
+        """
+        limit = self.app.max_body_size
+        if limit is not None:
+            declared = self.content_length()
+            if declared is not None and declared > limit:
+                raise PayloadTooLarge(f"Declared body size {declared} exceeds {limit} bytes.")
+
+        received: int = 0
         more_body: bool = True
         while more_body:
             message: dict[str, Any] = await self.receive()
-            body += message.get("body", b"")
+            chunk: bytes = message.get("body", b"")
             more_body = message.get("more_body", False)
+            if not chunk:
+                continue
+
+            received += len(chunk)
+            if limit is not None and received > limit:
+                raise PayloadTooLarge(f"Body size exceeds {limit} bytes.")
+            yield chunk
+
+    async def read_body(self) -> bytes | None:
+        """Collect the whole request body, joining the chunks once."""
+        chunks: list[bytes] = []
+        try:
+            async for chunk in self.iter_body():
+                chunks.append(chunk)
+        except PayloadTooLarge:
+            return await self.send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body is too large.")
+        return b"".join(chunks)
+
+    async def receive_body(self) -> dict[str, Any] | None:
+        """Handles receiving the body from an incoming request."""
+        body = await self.read_body()
+        if body is None: # already sent error
+            return None
 
         try:
-            body_json = json.loads(body.decode("utf-8"))
-        except json.JSONDecodeError:
+            body_json = self.app.serializer.loads(body)
+        except ValueError:  # covers JSONDecodeError and UnicodeDecodeError
             return await self.send_error(HTTPStatus.UNPROCESSABLE_ENTITY, "Invalid JSON payload.")
         return body_json
 
+    async def wait_for_disconnect(self) -> None:
+        """Wait until the client closes the connection, draining any body left."""
+        while True:
+            message: dict[str, Any] = await self.receive()
+            if message["type"] == "http.disconnect":
+                return
+
     async def send_json(
         self,
-        data: dict[str, Any],
+        data: dict[str, Any] | bytes,
         status: HTTPStatus = HTTPStatus.OK
     ) -> None:
-        """Send JSON response to the client."""
-        body: bytes = json.dumps(data).encode('utf-8')
+        """Send JSON response to the client, `bytes` are sent as already encoded JSON."""
+        body: bytes = data if isinstance(data, bytes) else self.app.serializer.dumps(data)
+        await self.send_body(body, status=status)
+
+    async def send_body(
+        self,
+        body: bytes,
+        status: HTTPStatus = HTTPStatus.OK,
+        content_type: bytes = b"application/json"
+    ) -> None:
+        """Send an already encoded response body to the client."""
+        encoding = None
+        if self.app.compression_min_size is not None and len(body) >= self.app.compression_min_size:
+            encoding = self.response_encoding()
+        await self.send_stream((body,), status, content_type, encoding)
+
+    async def send_chunks(
+        self,
+        chunks: Iterable[bytes],
+        status: HTTPStatus = HTTPStatus.OK,
+        content_type: bytes = b"application/json"
+    ) -> None:
+        """
+        Stream a response body produced piece by piece, meant for large bodies.
+        The first bytes go out before the rest of the body is produced.
+        """
+        await self.send_stream(chunks, status, content_type, self.response_encoding())
+
+    async def send_stream(
+        self,
+        chunks: Iterable[bytes],
+        status: HTTPStatus,
+        content_type: bytes,
+        encoding: str | None
+    ) -> None:
+        """
+        Send the response start and the body as `more_body` messages of
+        at most `response_chunk_size` bytes, compressed with `encoding`.
+        """
+        headers = [[b"content-type", content_type]]
+        if encoding is not None:
+            headers.append([b"content-encoding", encoding.encode()])
+            headers.append([b"vary", b"accept-encoding"])
         await self.send({
             "type": "http.response.start",
             "status": status.value,
-            "headers": [
-                [b"content-type", b"application/json"]
-            ],
+            "headers": headers,
         })
+
+        # Hold one piece back, the last one is sent with more_body=False
+        pending: bytes = b""
+        for piece in self._body_pieces(chunks, encoding):
+            if pending:
+                await self.send({
+                    "type": "http.response.body",
+                    "body": pending,
+                    "more_body": True
+                })
+            pending = piece
         await self.send({
             "type": "http.response.body",
-            "body": body
+            "body": pending
         })
 
+    def _body_pieces(self, chunks: Iterable[bytes], encoding: str | None) -> Iterator[bytes]:
+        encoder = ENCODERS[encoding]() if encoding is not None else None
+        size = self.app.response_chunk_size
+        for chunk in chunks:
+            if encoder is not None:
+                chunk = encoder.compress(chunk)
+            for start in range(0, len(chunk), size):
+                yield chunk[start:start + size]
+        if encoder is not None:
+            tail = encoder.flush()
+            for start in range(0, len(tail), size):
+                yield tail[start:start + size]
+
     async def send_error(
         self,
         status: HTTPStatus,
@@ -76,6 +215,126 @@ class ASGIServerBase:
         """Send an error response with a custom message."""
         await self.send_json({"error": message}, status=status)
 
-    async def default_response(self) -> None:
+
+class ASGIServerBase:
+    """
+    A base class for creating ASGI applications.
+
+    Responsibilities:
+    -----------------
+    - Handles ASGI lifecycle by processing incoming HTTP requests.
+    - Runs startup and shutdown hooks via the ASGI lifespan protocol.
+    - Wraps every request into its own `Request`, the app itself keeps no per-request state.
+    - Dispatches requests to handlers declared with `@route(method, template)`.
+    - Streams request bodies chunk by chunk, rejecting bodies larger than `max_body_size`.
+    - Encodes and decodes JSON with `serializer`, orjson or ujson when installed.
+    - Compresses responses of at least `compression_min_size` bytes with gzip or brotli
+      as negotiated by `Accept-Encoding`, and sends large bodies in `response_chunk_size` pieces.
+    """
+    request_class: type[Request] = Request
+
+    def __init__(
+        self,
+        max_body_size: int | None = DEFAULT_MAX_BODY_SIZE,
+        serializer: JSONSerializer | None = None,
+        compression_min_size: int | None = DEFAULT_COMPRESSION_MIN_SIZE,
+        response_chunk_size: int = DEFAULT_RESPONSE_CHUNK_SIZE
+    ):
+        self.max_body_size = max_body_size
+        self.serializer = serializer or default_serializer()
+        self.compression_min_size = compression_min_size
+        self.response_chunk_size = response_chunk_size
+        self.startup_hooks: list[Hook] = []
+        self.shutdown_hooks: list[Hook] = []
+        self.router = Router()
+        self.collect_routes()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] == 'lifespan':
+            return await self.handle_lifespan(receive, send)
+
+        request = self.request_class(self, scope, receive, send)
+        if scope['type'] == 'http':
+            await self.handle_request(request)
+        else:
+            await self.default_response(request)
+
+    def on_startup(self, hook: Hook) -> Hook:
+        """Run `hook` before the server accepts requests, can be used as a decorator."""
+        self.startup_hooks.append(hook)
+        return hook
+
+    def on_shutdown(self, hook: Hook) -> Hook:
+        """Run `hook` when the server stops, can be used as a decorator."""
+        self.shutdown_hooks.append(hook)
+        return hook
+
+    async def run_hooks(self, hooks: list[Hook]) -> None:
+        for hook in hooks:
+            result = hook()
+            if inspect.isawaitable(result):
+                await result
+
+    async def handle_lifespan(self, receive: Receive, send: Send) -> None:
+        """
+        Serve the ASGI lifespan protocol.
+
+        The server reports startup as complete only after every startup hook
+        has finished, so warm-up work is done before the first request arrives.
+        """
+        while True:
+            message: dict[str, Any] = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.run_hooks(self.startup_hooks)
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": repr(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                try:
+                    await self.run_hooks(self.shutdown_hooks)
+                except Exception as e:
+                    await send({"type": "lifespan.shutdown.failed", "message": repr(e)})
+                    return
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def collect_routes(self) -> None:
+        """Register every method decorated with `@route` in the router."""
+        for name in dir(type(self)):
+            attribute = getattr(type(self), name, None)
+            for method, template in getattr(attribute, ROUTES_ATTRIBUTE, ()):
+                self.add_route(method, template, getattr(self, name))
+
+    def add_route(self, method: str, template: str, handler: Handler) -> None:
+        """
+        Register a handler. It is called with the `Request` followed
+        by the path parameters as keyword arguments.
+        """
+        self.router.add(method, template, handler)
+
+    async def handle_request(self, request: Request) -> None:
+        """Dispatch the request to the route matching its method and path."""
+        found = self.router.match(request.path)
+        if found is None:
+            return await self.default_response(request)
+
+        routes, values = found
+        matched = routes.get(request.method)
+        if matched is None:
+            return await request.send_error(
+                HTTPStatus.NOT_FOUND, f"Method {request.method} not allowed."
+            )
+
+        # Lets middleware label the request by its template, not the raw path
+        request.scope["route"] = matched.template
+        try:
+            params = matched.convert(values)
+        except ValueError:
+            return await request.send_error(HTTPStatus.UNPROCESSABLE_ENTITY, "Invalid path parameter.")
+        await matched.handler(request, **params)
+
+    async def default_response(self, request: Request) -> None:
         """Send default 404 response for undefined routes."""
-        await self.send_error(HTTPStatus.NOT_FOUND, "Not found")
+        await request.send_error(HTTPStatus.NOT_FOUND, "Not found")
@@ -0,0 +1,75 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+class GzipEncoder:
+    """Incremental gzip compressor."""
+    name: bytes = b"gzip"
+
+    def __init__(self, level: int = 6):
+        # wbits=31 selects the gzip container instead of raw zlib
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    """Incremental brotli compressor."""
+    name: bytes = b"br"
+
+    def __init__(self, quality: int = 5):
+        # The default quality of 11 is far too slow for on-the-fly compression
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+# Supported encodings in order of preference
+ENCODERS: dict[str, type] = {
+    **({"br": BrotliEncoder} if brotli is not None else {}),
+    "gzip": GzipEncoder,
+}
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """
+    Choose a content coding from an `Accept-Encoding` header value.
+
+    Honors q-values (`q=0` forbids a coding) and `*`. Among equally
+    weighted codings the one listed first in `ENCODERS` wins.
+    Returns None when the response should not be compressed.
+    """
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding] = weight
+
+    best: str | None = None
+    best_weight = 0.0
+    for coding in ENCODERS:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
@@ -0,0 +1,77 @@
+from decimal import Context, Decimal, MAX_EMAX, MAX_PREC, localcontext
+from typing import Iterator
+
+
+def fibonacci_pair(n: int) -> tuple[int, int]:
+    """
+    Return (F(n), F(n + 1)) using the fast doubling identities.
+
+    F(2k)     = F(k) * (2 * F(k + 1) - F(k))
+    F(2k + 1) = F(k)^2 + F(k + 1)^2
+
+    Walks the bits of `n` from the most significant one, so it takes
+    O(log n) big-integer multiplications and is exact for any `n`.
+    """
+    if n < 0:
+        raise ValueError("n must be non-negative")
+
+    a, b = 0, 1  # F(0), F(1)
+    for bit in bin(n)[2:]:
+        c = a * (2 * b - a)
+        d = a * a + b * b
+        a, b = (d, c + d) if bit == "1" else (c, d)
+    return a, b
+
+
+def fibonacci(n: int) -> int:
+    """Exact n-th Fibonacci number."""
+    return fibonacci_pair(n)[0]
+
+
+def int_to_digits(value: int) -> str:
+    """
+    Decimal representation of an arbitrarily large integer.
+
+    `str()` refuses integers above `sys.get_int_max_str_digits()` digits,
+    `Decimal` has no such limit. Callers are expected to bound the size.
+    """
+    try:
+        return str(value)
+    except ValueError:
+        return str(Decimal(value))
+
+
+def _range_product(low: int, high: int) -> Decimal:
+    """Product of the integers in [low, high) as an exact Decimal."""
+    if high - low <= 32:
+        product = 1
+        for i in range(low, high):
+            product *= i
+        return Decimal(product)
+    middle = (low + high) // 2
+    return _range_product(low, middle) * _range_product(middle, high)
+
+
+def factorial_digits(n: int) -> bytes:
+    """
+    Decimal digits of n! as ASCII bytes.
+
+    Multiplies a balanced product tree in `Decimal` arithmetic: libmpdec
+    uses transform-based multiplication for huge operands and the result is
+    already in base 10, so there is no quadratic `int` -> `str` conversion.
+    Meant to run in a worker process for large `n`.
+    """
+    if n < 0:
+        raise ValueError("n must be non-negative")
+    context = Context(prec=MAX_PREC, Emax=MAX_EMAX)
+    with localcontext(context):
+        return str(_range_product(1, n + 1)).encode()
+
+
+def iter_json_result(digits: bytes, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Yield `{"result": <digits>}` in pieces of about `chunk_size` bytes."""
+    yield b'{"result": '
+    view = memoryview(digits)
+    for start in range(0, len(view), chunk_size):
+        yield bytes(view[start:start + chunk_size])
+    yield b"}"
@@ -0,0 +1,131 @@
+from dataclasses import dataclass, field
+from typing import Callable, Awaitable, Any
+
+Handler = Callable[..., Awaitable[None]]
+
+# Converters usable in path templates, e.g. `/fibonacci/{n:int}`
+CONVERTERS: dict[str, Callable[[str], Any]] = {
+    "str": str,
+    "int": int,
+    "float": float,
+}
+
+ROUTES_ATTRIBUTE = "__routes__"
+
+
+def route(method: str, template: str) -> Callable[[Handler], Handler]:
+    """
+    Mark a method of an `ASGIServerBase` subclass as a route handler.
+
+    The handler gets the `Request` and the path parameters from the
+    template as keyword arguments:
+
+        @route("GET", "/fibonacci/{n:int}")
+        async def get_fibonacci(self, request: Request, n: int) -> None: ...
+    """
+    def decorator(handler: Handler) -> Handler:
+        routes = handler.__dict__.setdefault(ROUTES_ATTRIBUTE, [])
+        routes.append((method.upper(), template))
+        return handler
+    return decorator
+
+
+@dataclass
+class Route:
+    """A handler bound to a method and a path template."""
+    method: str
+    template: str
+    handler: Handler
+    # (name, converter) for every `{...}` segment, in path order
+    params: list[tuple[str, Callable[[str], Any]]] = field(default_factory=list)
+
+    def convert(self, values: list[str]) -> dict[str, Any]:
+        """Convert captured path segments. Raises ValueError on bad input."""
+        return {
+            name: converter(value)
+            for (name, converter), value in zip(self.params, values)
+        }
+
+
+@dataclass
+class _Node:
+    """A segment trie node. Static children win over the wildcard one."""
+    children: dict[str, "_Node"] = field(default_factory=dict)
+    wildcard: "_Node | None" = None
+    routes: dict[str, Route] = field(default_factory=dict)
+
+
+def split_path(path: str) -> list[str]:
+    return path.strip("/").split("/") if path != "/" else []
+
+
+class Router:
+    """
+    Resolves request paths to routes.
+
+    Templates without parameters live in a plain dict keyed by path, templated
+    ones in a trie keyed by path segments. Lookup cost depends on the path
+    depth only, not on the number of registered routes.
+    """
+    def __init__(self):
+        self.static: dict[str, dict[str, Route]] = {}
+        self.root = _Node()
+
+    def add(self, method: str, template: str, handler: Handler) -> Route:
+        """Register `handler` for `method` requests matching `template`."""
+        params: list[tuple[str, Callable[[str], Any]]] = []
+        node = self.root
+        for segment in split_path(template):
+            if segment.startswith("{") and segment.endswith("}"):
+                name, _, converter = segment[1:-1].partition(":")
+                if converter and converter not in CONVERTERS:
+                    raise ValueError(f"Unknown converter '{converter}' in {template}")
+                params.append((name, CONVERTERS[converter or "str"]))
+                if node.wildcard is None:
+                    node.wildcard = _Node()
+                node = node.wildcard
+            else:
+                node = node.children.setdefault(segment, _Node())
+
+        new_route = Route(method.upper(), template, handler, params)
+        if params:
+            node.routes[new_route.method] = new_route
+        else:
+            self.static.setdefault(template, {})[new_route.method] = new_route
+        return new_route
+
+    def match(self, path: str) -> tuple[dict[str, Route], list[str]] | None:
+        """
+        Find routes for `path`.
+
+        Returns routes by method together with the captured raw
+        parameter values, or None if no template matches the path.
+        """
+        routes = self.static.get(path)
+        if routes is not None:
+            return routes, []
+
+        values: list[str] = []
+        node = self._match(self.root, split_path(path), 0, values)
+        if node is None:
+            return None
+        return node.routes, values
+
+    def _match(self, node: _Node, segments: list[str], index: int, values: list[str]) -> _Node | None:
+        if index == len(segments):
+            return node if node.routes else None
+
+        segment = segments[index]
+        child = node.children.get(segment)
+        if child is not None:
+            found = self._match(child, segments, index + 1, values)
+            if found is not None:
+                return found
+
+        if node.wildcard is not None and segment:
+            values.append(segment)
+            found = self._match(node.wildcard, segments, index + 1, values)
+            if found is not None:
+                return found
+            values.pop()
+        return None
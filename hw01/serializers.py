@@ -0,0 +1,65 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # optional speedup
+    ujson = None
+
+
+class JSONSerializer:
+    """
+    Encodes response payloads to bytes and decodes request bodies.
+
+    The base implementation uses the standard library. Subclasses plug in
+    faster libraries and fall back to it for values those cannot encode,
+    such as integers wider than 64 bits.
+    """
+    name: str = "json"
+
+    def dumps(self, data: Any) -> bytes:
+        return json.dumps(data).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonSerializer(JSONSerializer):
+    name = "orjson"
+
+    def dumps(self, data: Any) -> bytes:
+        try:
+            return orjson.dumps(data)
+        except TypeError:  # orjson.JSONEncodeError, e.g. big integers
+            return super().dumps(data)
+
+    def loads(self, data: bytes) -> Any:
+        # Note: integers wider than 64 bits are decoded as floats
+        return orjson.loads(data)
+
+
+class UjsonSerializer(JSONSerializer):
+    name = "ujson"
+
+    def dumps(self, data: Any) -> bytes:
+        try:
+            return ujson.dumps(data, ensure_ascii=False).encode("utf-8")
+        except (TypeError, OverflowError):
+            return super().dumps(data)
+
+    def loads(self, data: bytes) -> Any:
+        return ujson.loads(data)
+
+
+def default_serializer() -> JSONSerializer:
+    """Pick the fastest JSON library that is installed."""
+    if orjson is not None:
+        return OrjsonSerializer()
+    if ujson is not None:
+        return UjsonSerializer()
+    return JSONSerializer()
@@ -1,10 +1,18 @@
+import asyncio
+import os
 import uvicorn
 import math
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from typing import Callable, Awaitable, Any
 from http import HTTPStatus
 from urllib.parse import parse_qs
 
-from asgi_base import ASGIServerBase
+from asgi_base import ASGIServerBase, PayloadTooLarge, Request
+from metrics import MetricsMiddleware
+from routing import route
+from streaming_json import FloatArrayParser, InvalidJSONError, NotAFloatArrayError
+import fast_math
 
 
 class SimpleMathASGIServer(ASGIServerBase):
@@ -15,78 +23,172 @@ class SimpleMathASGIServer(ASGIServerBase):
     ----------
     1. GET /factorial?n={number}
         - Returns the factorial of a non-negative integer `n`.
-        - Errors: 400 (if `n` is negative), 422 (if `n` is missing or invalid).
+        - Values above `factorial_offload_n` are computed in a process pool.
+        - Errors: 400 (if `n` is negative or above `max_factorial_n`), 422 (if `n` is missing or invalid),
+          503 (if the computation exceeds `factorial_timeout` seconds).
 
     2. GET /fibonacci/{n}
-        - Returns the `n`th Fibonacci number.
-        - Errors: 400 (if `n` is negative), 422 (if `n` is invalid).
+        - Returns the exact `n`th Fibonacci number.
+        - Errors: 400 (if `n` is negative or above `max_fibonacci_n`), 422 (if `n` is invalid).
 
     3. GET /mean
         - Accepts a JSON array of floats and returns their mean.
         - Errors: 400 (if the array is empty), 422 (if the body is not a valid float array).
     """
-    async def handle_request(self) -> None:
-        path: str = self.scope["path"]
-
-        method: str = self.scope["method"]
-        if method != "GET":
-            await self.send_error(
-                HTTPStatus.NOT_FOUND, f"Method {method} not allowed."
-            )
-            return
-
-        if path.startswith("/factorial"):
-            await self.get_factorial()
-        elif path.startswith("/fibonacci/"):
-            await self.get_fibonacci()
-        elif path == "/mean":
-            await self.get_mean()
-        else:
-            await self.default_response()
-
-    async def get_factorial(self) -> None:
-        query_string = self.scope.get('query_string', b'').decode('utf-8')
+    def __init__(
+        self,
+        max_fibonacci_n: int = 100_000,
+        fibonacci_cache_size: int = 1024,
+        max_factorial_n: int = 100_000,
+        factorial_offload_n: int = 1_000,
+        factorial_timeout: float = 30.0,
+        max_workers: int | None = None,
+        **kwargs: Any
+    ):
+        super().__init__(**kwargs)
+        self.max_fibonacci_n = max_fibonacci_n
+        self.max_factorial_n = max_factorial_n
+        self.factorial_offload_n = factorial_offload_n
+        self.factorial_timeout = factorial_timeout
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor: ProcessPoolExecutor | None = None
+        # Keeps encoded results, the decimal conversion costs more than the computation
+        self.fibonacci_cache_size = fibonacci_cache_size
+        self.fibonacci_digits: Callable[[int], bytes] = lru_cache(maxsize=fibonacci_cache_size)(
+            self._fibonacci_digits
+        )
+        # Encoded n! for every n computed inline, filled at startup
+        self.factorial_table: list[bytes] = []
+
+        self.on_startup(self.warm_up)
+        self.on_shutdown(self.close_executor)
+
+    async def warm_up(self) -> None:
+        """
+        Precompute small results and start the worker processes
+        before the first request, so it does not pay for either.
+        """
+        factorial = 1
+        table = [b"1"]
+        for n in range(1, self.factorial_offload_n + 1):
+            factorial *= n
+            table.append(fast_math.int_to_digits(factorial).encode())
+        self.factorial_table = table
+
+        for n in range(min(self.fibonacci_cache_size, self.max_fibonacci_n + 1)):
+            self.fibonacci_digits(n)
+
+        # Submit one job per worker at once so that the pool forks all of them
+        executor = self.get_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(executor, fast_math.fibonacci, 1)
+            for _ in range(self.max_workers)
+        ))
+
+    async def close_executor(self) -> None:
+        """Stop the worker processes, dropping jobs that have not started yet."""
+        if self.executor is not None:
+            executor, self.executor = self.executor, None
+            await asyncio.to_thread(executor.shutdown, cancel_futures=True)
+
+    @route("GET", "/factorial")
+    async def get_factorial(self, request: Request) -> None:
+        query_string = request.scope.get('query_string', b'').decode('utf-8')
         query_params = parse_qs(query_string)
         n_str = query_params.get('n', [None])[0]
 
-        n = await self.handle_positive_integer(n_str)
+        n = await self.handle_positive_integer(request, n_str)
         if n is None: # already sent error
             return
 
-        result = math.factorial(n)
-        await self.send_json({"result": result})
+        if n > self.max_factorial_n:
+            return await request.send_error(
+                HTTPStatus.BAD_REQUEST, f"Value must not exceed {self.max_factorial_n}."
+            )
 
-    async def get_fibonacci(self) -> None:
-        path: str = self.scope["path"]
-        n_str = path.split('/')[-1]
+        if n < len(self.factorial_table):
+            return await request.send_json(b'{"result": ' + self.factorial_table[n] + b'}')
 
-        n = await self.handle_positive_integer(n_str)
-        if not isinstance(n, int):
+        if n <= self.factorial_offload_n:
+            digits = fast_math.int_to_digits(math.factorial(n)).encode()
+            return await request.send_json(b'{"result": ' + digits + b'}')
+
+        digits = await self.run_in_process(request, fast_math.factorial_digits, n)
+        if digits is None: # already sent error or client is gone
             return
 
-        result = self.fibonacci(n)
-        await self.send_json({"result": result})
+        # A large factorial has hundreds of thousands of digits, send them piece by piece
+        await request.send_chunks(fast_math.iter_json_result(digits))
 
-    async def get_mean(self) -> None:
-        body = await self.receive_body()
-        if body is None:
+    @route("GET", "/fibonacci/{n:int}")
+    async def get_fibonacci(self, request: Request, n: int) -> None:
+        n = await self.handle_positive_integer(request, n)
+        if not isinstance(n, int):
             return
 
-        # Validate that body is a list of floats
-        try:
-            numbers = body if isinstance(body, list) else []
-            numbers = [float(num) for num in numbers]
-        except ValueError:
-            return await self.send_error(HTTPStatus.UNPROCESSABLE_ENTITY, "Body must be an array of floats.")
+        if n > self.max_fibonacci_n:
+            return await request.send_error(
+                HTTPStatus.BAD_REQUEST, f"Value must not exceed {self.max_fibonacci_n}."
+            )
 
+        await request.send_json(b'{"result": ' + self.fibonacci_digits(n) + b'}')
 
-        if len(numbers) == 0:
-            await self.send_error(HTTPStatus.BAD_REQUEST, "Array of floats cannot be empty.")
+    @route("GET", "/mean")
+    async def get_mean(self, request: Request) -> None:
+        # Parse the array while it arrives, only a running sum is kept in memory
+        parser = FloatArrayParser()
+        try:
+            async for chunk in request.iter_body():
+                parser.feed(chunk)
+            parser.close()
+        except PayloadTooLarge:
+            return await request.send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body is too large.")
+        except InvalidJSONError:
+            return await request.send_error(HTTPStatus.UNPROCESSABLE_ENTITY, "Invalid JSON payload.")
+        except NotAFloatArrayError:
+            return await request.send_error(HTTPStatus.UNPROCESSABLE_ENTITY, "Body must be an array of floats.")
+
+        if parser.count == 0:
+            await request.send_error(HTTPStatus.BAD_REQUEST, "Array of floats cannot be empty.")
         else:
-            result = sum(numbers) / len(numbers)
-            await self.send_json({"result": result})
+            await request.send_json({"result": parser.mean})
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        """Process pool for CPU-heavy computations, created on first use."""
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self.executor
+
+    async def run_in_process(self, request: Request, func: Callable[..., Any], *args: Any) -> Any | None:
+        """
+        Run `func(*args)` in the process pool without blocking the event loop.
+
+        Gives up after `factorial_timeout` seconds (sends 503) or as soon as the
+        client disconnects (sends nothing). Work that has not started yet is
+        cancelled, work already running in a worker is abandoned.
+        """
+        loop = asyncio.get_running_loop()
+        job = loop.run_in_executor(self.get_executor(), func, *args)
+        disconnect = asyncio.ensure_future(request.wait_for_disconnect())
+        try:
+            done, _ = await asyncio.wait(
+                {job, disconnect},
+                timeout=self.factorial_timeout,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            disconnect.cancel()
 
-    async def handle_positive_integer(self, value: str) -> int | None:
+        if job in done:
+            return job.result()
+
+        job.cancel()
+        if disconnect in done:
+            return None
+        return await request.send_error(HTTPStatus.SERVICE_UNAVAILABLE, "Computation timed out.")
+
+    async def handle_positive_integer(self, request: Request, value: str) -> int | None:
         """
         Helper function to validate if a given value is a non-negative integer.
         """
@@ -94,22 +196,22 @@ class SimpleMathASGIServer(ASGIServerBase):
         try:
             value = int(value)
         except Exception as e:
-            return await self.send_error(HTTPStatus.UNPROCESSABLE_ENTITY, msg)
+            return await request.send_error(HTTPStatus.UNPROCESSABLE_ENTITY, msg)
 
 
         n = int(value)
         if n < 0:
-            return await self.send_error(HTTPStatus.BAD_REQUEST, msg)
+            return await request.send_error(HTTPStatus.BAD_REQUEST, msg)
         return n
 
     def fibonacci(self, n: int) -> int:
-        # https://en.wikipedia.org/wiki/Fibonacci_sequence#Binet's_formula
-        # phi = ( 1 + sqrt(5) ) / 2
-        # fib = floor (phi^n/sqrt(5) + 0.5)
-        phi = (1 + math.sqrt(5)) / 2
-        f = (phi**n) / math.sqrt(5)
-        return int(f + 0.5)  # round to nearest integer
+        # https://www.nayuki.io/page/fast-fibonacci-algorithms
+        # exact, O(log n) big-integer multiplications
+        return fast_math.fibonacci(n)
+
+    def _fibonacci_digits(self, n: int) -> bytes:
+        return fast_math.int_to_digits(self.fibonacci(n)).encode()
 
 
 if __name__ == "__main__":
-    uvicorn.run(SimpleMathASGIServer(), host="localhost", port=8000)
+    uvicorn.run(MetricsMiddleware(SimpleMathASGIServer()), host="localhost", port=8000)
@@ -0,0 +1,167 @@
+import json
+import math
+from itertools import chain
+from typing import Any
+
+# Bytes that never appear in a flat array of numbers. A chunk segment
+# containing any of them is handed over to the buffered fallback parser.
+_COMPLEX_TOKENS: bytes = b'"[]{}'
+
+
+class InvalidJSONError(ValueError):
+    """The body is not a valid JSON document."""
+
+
+class NotAFloatArrayError(ValueError):
+    """The body is valid JSON, but some array entry is not a float."""
+
+
+class NeumaierSum:
+    """
+    Running compensated sum (Neumaier's improvement of Kahan summation).
+
+    Keeps the rounding error of every addition in a separate compensation
+    term, so long sums of floats of different magnitude stay accurate.
+    """
+    __slots__ = ("total", "compensation")
+
+    def __init__(self):
+        self.total: float = 0.0
+        self.compensation: float = 0.0
+
+    def add(self, value: float) -> None:
+        total = self.total + value
+        if abs(self.total) >= abs(value):
+            self.compensation += (self.total - total) + value
+        else:
+            self.compensation += (value - total) + self.total
+        self.total = total
+
+    @property
+    def value(self) -> float:
+        if not math.isfinite(self.total):
+            return self.total
+        return self.total + self.compensation
+
+
+class FloatArrayParser:
+    """
+    Incremental parser for a JSON array of floats.
+
+    Feed it the body chunk by chunk. Complete elements of every chunk are
+    decoded in bulk with `json.loads` and folded into a running count and
+    compensated sum, only the element cut by the chunk boundary is carried
+    over. Memory therefore stays bounded by the chunk size.
+
+    Bodies that are not a flat array of numbers (strings, nested values,
+    non-array documents) are buffered and validated exactly like
+    `json.loads` followed by `float()` on every element would do.
+
+    Errors:
+    -------
+    - `InvalidJSONError` if the body is not valid JSON.
+    - `NotAFloatArrayError` if an array entry cannot be converted to float.
+    A document that is not an array is treated as an empty array.
+    """
+    def __init__(self):
+        self.count: int = 0
+        self._sum = NeumaierSum()
+        self._started: bool = False
+        self._seen_comma: bool = False
+        self._invalid_entry: bool = False
+        self._tail: bytes = b""
+        # Set when the body cannot be streamed, holds the unparsed rest
+        self._buffer: list[bytes] | None = None
+        self._is_array: bool = True
+
+    @property
+    def mean(self) -> float:
+        return self._sum.value / self.count
+
+    def feed(self, chunk: bytes) -> None:
+        """Consume the next chunk of the body."""
+        if self._buffer is not None:
+            self._buffer.append(chunk)
+            return
+
+        data = self._tail + chunk if self._tail else chunk
+        if not self._started:
+            data = data.lstrip()
+            if not data:
+                return
+            if data[:1] != b"[":
+                self._is_array = False
+                self._buffer = [data]
+                return
+            data = data[1:]
+            self._started = True
+
+        last_comma = data.rfind(b",")
+        if last_comma == -1:
+            self._tail = data
+            return
+
+        segment, self._tail = data[:last_comma], data[last_comma + 1:]
+        if any(token in segment for token in _COMPLEX_TOKENS):
+            # The boundary comma may sit inside a string, parse the rest at once
+            self._buffer = [data]
+            self._tail = b""
+            return
+
+        if not segment.strip():
+            raise InvalidJSONError("Missing array element.")
+        self._consume(self._loads(b"[" + segment + b"]"))
+        self._seen_comma = True
+
+    def close(self) -> None:
+        """Signal the end of the body and validate what is left."""
+        if self._buffer is not None:
+            rest = b"".join(self._buffer)
+            self._buffer = None
+            if not self._is_array:
+                document = self._loads(rest)
+                if isinstance(document, list):
+                    self._consume(document)
+            elif self._seen_comma:
+                # A placeholder keeps "[1,]" invalid once the prefix is cut off
+                self._consume(self._loads(b"[0," + rest)[1:])
+            else:
+                self._consume(self._loads(b"[" + rest))
+        elif not self._started:
+            raise InvalidJSONError("Empty body.")
+        else:
+            values = self._loads(b"[" + self._tail)
+            if self._seen_comma and not values:
+                raise InvalidJSONError("Missing array element.")
+            self._consume(values)
+
+        if self._invalid_entry:
+            raise NotAFloatArrayError("Body must be an array of floats.")
+
+    def _loads(self, data: bytes) -> Any:
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise InvalidJSONError(str(e)) from e
+
+    def _consume(self, values: list[Any]) -> None:
+        if self._invalid_entry:
+            # Keep validating the syntax only, the result is already an error
+            return
+        try:
+            numbers = [float(value) for value in values]
+        except (TypeError, ValueError, OverflowError):
+            self._invalid_entry = True
+            return
+
+        try:
+            # fsum is exact but rounds once, its residual keeps the lost bits
+            partial = math.fsum(numbers)
+            residual = math.fsum(chain(numbers, (-partial,)))
+        except (ValueError, OverflowError):  # inf - inf or intermediate overflow
+            for number in numbers:
+                self._sum.add(number)
+        else:
+            self._sum.add(partial)
+            self._sum.add(residual)
+        self.count += len(numbers)
@@ -16,7 +16,7 @@ sleep 4
 
 # Run pytest for the test.py file
 echo "Running tests..."
-poetry run pytest "$TESTS_DIR/test_hw01.py"
+poetry run pytest "$TESTS_DIR"
 
 # After the tests finish, kill the server
 echo "Stopping the ASGI server..."
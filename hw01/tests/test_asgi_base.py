@@ -0,0 +1,346 @@
+"""Тесты базового ASGI-класса без запуска сервера.
+
+Запускаются через `./tests/run.sh` (нужен `PYTHONPATH` с папкой hw01).
+"""
+
+import asyncio
+import gzip
+import json
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable
+
+import pytest
+
+from asgi_base import ASGIServerBase, Request
+from compression import ENCODERS
+from metrics import MetricsMiddleware
+from routing import route
+from serializers import JSONSerializer, default_serializer
+from simple_math_asgi import SimpleMathASGIServer
+
+
+class EchoServer(ASGIServerBase):
+    """Returns the parsed JSON body back to the client."""
+    async def handle_request(self, request: Request) -> None:
+        body = await request.receive_body()
+        if body is None:
+            return
+        await request.send_json({"body": body})
+
+
+def call_app(
+    app: ASGIServerBase,
+    chunks: list[bytes],
+    headers: list[tuple[bytes, bytes]] | None = None,
+    path: str = "/",
+    method: str = "GET",
+) -> tuple[int, Any]:
+    """Run one request through `app` and return (status, parsed body)."""
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": b"",
+        "headers": headers or [],
+    }
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ] or [{"type": "http.request", "body": b"", "more_body": False}]
+    sent: list[dict[str, Any]] = []
+
+    async def receive() -> dict[str, Any]:
+        if messages:
+            return messages.pop(0)
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict[str, Any]) -> None:
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+
+    status = sent[0]["status"]
+    body = b"".join(m.get("body", b"") for m in sent[1:])
+    return status, json.loads(body)
+
+
+def test_body_is_joined_from_chunks():
+    status, data = call_app(EchoServer(), [b"[1, 2", b", 3", b"]"])
+
+    assert status == HTTPStatus.OK
+    assert data == {"body": [1, 2, 3]}
+
+
+@pytest.mark.parametrize(
+    ("chunks", "headers"),
+    [
+        ([b"x" * 8, b"x" * 8], []),
+        ([b"[]"], [(b"content-length", b"1000")]),
+    ],
+)
+def test_oversize_body_rejected(chunks: list[bytes], headers: list[tuple[bytes, bytes]]):
+    status, _ = call_app(EchoServer(max_body_size=10), chunks, headers)
+
+    assert status == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+
+def test_invalid_json_body():
+    status, _ = call_app(EchoServer(), [b"\xff\xfe{"])
+
+    assert status == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+class RoutedServer(ASGIServerBase):
+    @route("GET", "/items/{item_id:int}")
+    async def get_item(self, request: Request, item_id: int) -> None:
+        await request.send_json({"item_id": item_id})
+
+    @route("GET", "/items/latest")
+    async def get_latest(self, request: Request) -> None:
+        await request.send_json({"item_id": "latest"})
+
+    @route("GET", "/items/{item_id:int}/tags/{tag}")
+    async def get_tag(self, request: Request, item_id: int, tag: str) -> None:
+        await request.send_json({"item_id": item_id, "tag": tag})
+
+
+@pytest.mark.parametrize(
+    ("method", "path", "status_code", "expected"),
+    [
+        ("GET", "/items/7", HTTPStatus.OK, {"item_id": 7}),
+        ("GET", "/items/latest", HTTPStatus.OK, {"item_id": "latest"}),
+        ("GET", "/items/7/tags/red", HTTPStatus.OK, {"item_id": 7, "tag": "red"}),
+        ("GET", "/items/lol", HTTPStatus.UNPROCESSABLE_ENTITY, None),
+        ("GET", "/items", HTTPStatus.NOT_FOUND, None),
+        ("GET", "/items/7/tags", HTTPStatus.NOT_FOUND, None),
+        ("POST", "/items/7", HTTPStatus.NOT_FOUND, None),
+    ],
+)
+def test_routing(method: str, path: str, status_code: int, expected: dict[str, Any] | None):
+    status, data = call_app(RoutedServer(), [], path=path, method=method)
+
+    assert status == status_code
+    if expected is not None:
+        assert data == expected
+
+
+class SlowEchoServer(ASGIServerBase):
+    """Echoes the path parameter back after sleeping for `delay` milliseconds."""
+    @route("GET", "/echo/{value:int}/{delay:int}")
+    async def echo(self, request: Request, value: int, delay: int) -> None:
+        await asyncio.sleep(delay / 1000)
+        body = await request.receive_body()
+        if body is None:
+            return
+        await request.send_json({"path": request.path, "value": value, "body": body})
+
+
+def test_concurrent_requests_do_not_share_state():
+    app = SlowEchoServer()
+    requests_count = 2000
+
+    async def one_request(value: int) -> dict[str, Any]:
+        # Slow and fast requests interleave, every handler awaits in the middle
+        delay = 20 if value % 3 == 0 else 0
+        path = f"/echo/{value}/{delay}"
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": b"",
+            "headers": [],
+        }
+        body = json.dumps([value]).encode()
+        sent: list[dict[str, Any]] = []
+
+        async def receive() -> dict[str, Any]:
+            await asyncio.sleep(0)
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message: dict[str, Any]) -> None:
+            await asyncio.sleep(0)
+            sent.append(message)
+
+        await app(scope, receive, send)
+        assert sent[0]["status"] == HTTPStatus.OK
+        return json.loads(sent[1]["body"])
+
+    async def run_all() -> list[dict[str, Any]]:
+        return await asyncio.gather(*(one_request(i) for i in range(requests_count)))
+
+    responses = asyncio.run(run_all())
+
+    for value, response in enumerate(responses):
+        delay = 20 if value % 3 == 0 else 0
+        assert response == {"path": f"/echo/{value}/{delay}", "value": value, "body": [value]}
+
+
+@pytest.mark.parametrize(
+    "serializer",
+    [JSONSerializer(), default_serializer()],
+    ids=lambda serializer: serializer.name,
+)
+def test_serializers_round_trip(serializer: JSONSerializer):
+    payload = [1, 2.5, "текст", None, {"nested": [True]}]
+    status, data = call_app(EchoServer(serializer=serializer), [json.dumps(payload).encode()])
+
+    assert status == HTTPStatus.OK
+    assert data == {"body": payload}
+    # Integers wider than 64 bits fall back to the standard library
+    assert json.loads(serializer.dumps({"result": 10**30})) == {"result": 10**30}
+
+
+class LargeBodyServer(ASGIServerBase):
+    @route("GET", "/large")
+    async def get_large(self, request: Request) -> None:
+        await request.send_body(b"0123456789" * 1000, content_type=b"text/plain")
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "content_encoding"),
+    [
+        (b"gzip, deflate", b"gzip"),
+        (b"gzip;q=0, identity", None),
+        (b"*", b"br" if "br" in ENCODERS else b"gzip"),
+        (b"", None),
+    ],
+)
+def test_response_compression_and_chunking(accept_encoding: bytes, content_encoding: bytes | None):
+    app = LargeBodyServer(response_chunk_size=1000)
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/large",
+        "query_string": b"",
+        "headers": [(b"accept-encoding", accept_encoding)],
+    }
+    sent: list[dict[str, Any]] = []
+
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict[str, Any]) -> None:
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+
+    headers = dict(sent[0]["headers"])
+    assert headers.get(b"content-encoding") == content_encoding
+    assert all(len(message["body"]) <= 1000 for message in sent[1:])
+    assert [message.get("more_body", False) for message in sent[1:]][-1] is False
+
+    body = b"".join(message["body"] for message in sent[1:])
+    if content_encoding == b"gzip":
+        body = gzip.decompress(body)
+    elif content_encoding == b"br":
+        body = pytest.importorskip("brotli").decompress(body)
+    else:
+        assert len(sent) == 11  # start + 10 pieces of 1000 bytes
+    assert body == b"0123456789" * 1000
+
+
+def test_metrics_middleware():
+    app = MetricsMiddleware(RoutedServer())
+
+    for path in ["/items/1", "/items/2", "/items/lol", "/unknown"]:
+        call_app(app, [b"{}"], path=path)
+
+    scope = {"type": "http", "method": "GET", "path": "/metrics", "headers": []}
+    sent: list[dict[str, Any]] = []
+
+    async def send(message: dict[str, Any]) -> None:
+        sent.append(message)
+
+    asyncio.run(app(scope, None, send))
+    text = sent[1]["body"].decode()
+
+    assert sent[0]["status"] == HTTPStatus.OK
+    assert 'http_responses_total{method="GET",route="/items/{item_id:int}",status="200"} 2' in text
+    assert 'http_responses_total{method="GET",route="/items/{item_id:int}",status="422"} 1' in text
+    assert 'http_responses_total{method="GET",route="<unmatched>",status="404"} 1' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/{item_id:int}"} 3' in text
+    assert 'http_request_size_bytes_bucket{method="GET",route="<unmatched>",le="64.0"} 1' in text
+    assert 'http_requests_in_progress{method="GET"} 0' in text
+
+
+def run_lifespan(app: ASGIServerBase) -> list[str]:
+    """Run startup and shutdown, return the types of the messages sent back."""
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent: list[str] = []
+
+    async def receive() -> dict[str, Any]:
+        return messages.pop(0)
+
+    async def send(message: dict[str, Any]) -> None:
+        sent.append(message["type"])
+
+    asyncio.run(app({"type": "lifespan"}, receive, send))
+    return sent
+
+
+def test_lifespan_hooks():
+    app = ASGIServerBase()
+    calls: list[str] = []
+
+    @app.on_startup
+    async def warm_up() -> None:
+        await asyncio.sleep(0)
+        calls.append("startup")
+
+    app.on_shutdown(lambda: calls.append("shutdown"))
+
+    assert run_lifespan(app) == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert calls == ["startup", "shutdown"]
+
+
+def test_lifespan_startup_failure():
+    app = ASGIServerBase()
+
+    @app.on_startup
+    def fail() -> None:
+        raise RuntimeError("no database")
+
+    assert run_lifespan(app) == ["lifespan.startup.failed"]
+
+
+def call_factorial(receive: Callable[[], Awaitable[dict[str, Any]]]) -> list[dict[str, Any]]:
+    """Request a factorial large enough for the process pool, return the messages sent."""
+    app = SimpleMathASGIServer(factorial_timeout=0.05, factorial_offload_n=10, max_workers=1)
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/factorial",
+        "query_string": b"n=100000",
+        "headers": [],
+    }
+    sent: list[dict[str, Any]] = []
+
+    async def send(message: dict[str, Any]) -> None:
+        sent.append(message)
+
+    async def main() -> None:
+        try:
+            await app(scope, receive, send)
+        finally:
+            await app.close_executor()
+
+    asyncio.run(main())
+    return sent
+
+
+def test_factorial_timeout():
+    async def receive() -> dict[str, Any]:
+        # The client stays connected and sends nothing
+        await asyncio.Event().wait()
+        return {"type": "http.disconnect"}
+
+    sent = call_factorial(receive)
+
+    assert sent[0]["status"] == HTTPStatus.SERVICE_UNAVAILABLE
+
+
+def test_factorial_abandoned_on_disconnect():
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.disconnect"}
+
+    assert call_factorial(receive) == []
@@ -3,6 +3,10 @@
 Адрес: localhost:8000
 """
 
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 from http import HTTPStatus
 from typing import Any
 
@@ -82,4 +86,132 @@ def test_mean(json: dict[str, Any] | None, status_code: int):
 
     assert response.status_code == status_code
     if status_code == HTTPStatus.OK:
-        assert "result" in response.json()
\ No newline at end of file
+        assert "result" in response.json()
+
+
+@pytest.mark.parametrize(
+    ("body", "status_code"),
+    [
+        (b"[1, 2,", HTTPStatus.UNPROCESSABLE_ENTITY),
+        (b"[1, 2,]", HTTPStatus.UNPROCESSABLE_ENTITY),
+        (b'[1, "lol"]', HTTPStatus.UNPROCESSABLE_ENTITY),
+        (b"[1, null]", HTTPStatus.UNPROCESSABLE_ENTITY),
+        (b'{"a": 1}', HTTPStatus.BAD_REQUEST),
+        (b'[1, "2.5", true]', HTTPStatus.OK),
+    ],
+)
+def test_mean_validation(body: bytes, status_code: int):
+    response = requests.get(BASE_URL + "/mean", data=body)
+
+    assert response.status_code == status_code
+
+
+def test_mean_chunked_body():
+    numbers = [1e16, 1.0, -1e16] * 10_000 + [0.5] * 7
+
+    def chunks():
+        body = json.dumps(numbers).encode()
+        for start in range(0, len(body), 1000):
+            yield body[start:start + 1000]
+
+    response = requests.get(BASE_URL + "/mean", data=chunks())
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["result"] == pytest.approx(10_003.5 / len(numbers), rel=1e-12)
+
+
+def _slow_fibonacci(n: int) -> int:
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+
+
+@pytest.mark.parametrize("n", [70, 71, 100, 1500, 15_000])
+def test_fibonacci_exact(n: int):
+    response = requests.get(BASE_URL + f"/fibonacci/{n}")
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.text == f'{{"result": {_slow_fibonacci(n)}}}'
+
+
+def test_fibonacci_limit():
+    response = requests.get(BASE_URL + "/fibonacci/1000000000")
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.parametrize("n", [1000, 1001, 20_000])
+def test_factorial_exact(n: int):
+    response = requests.get(BASE_URL + "/factorial", params={"n": n})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.text == f'{{"result": {Decimal(math.factorial(n))}}}'
+
+
+def test_factorial_limit():
+    response = requests.get(BASE_URL + "/factorial", params={"n": 10**9})
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.parametrize(
+    ("method", "path"),
+    [
+        ("GET", "/factorialXYZ"),
+        ("GET", "/fibonacci"),
+        ("GET", "/fibonacci/1/2"),
+        ("GET", "/meanest"),
+        ("POST", "/mean"),
+    ],
+)
+def test_routes_match_exactly(method: str, path: str):
+    response = requests.request(method, BASE_URL + path)
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_interleaved_slow_and_fast_requests():
+    # Offloaded factorials keep their handlers suspended while fast requests run
+    def one_request(i: int) -> None:
+        if i % 4 == 0:
+            n = 1_001 + i
+            response = requests.get(BASE_URL + "/factorial", params={"n": n})
+            assert response.text == f'{{"result": {Decimal(math.factorial(n))}}}'
+        elif i % 4 == 1:
+            response = requests.get(BASE_URL + f"/fibonacci/{i}")
+            assert response.json() == {"result": _slow_fibonacci(i)}
+        else:
+            response = requests.get(BASE_URL + "/mean", json=[i, i + 2])
+            assert response.json() == {"result": i + 1}
+
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        list(pool.map(one_request, range(200)))
+
+
+@pytest.mark.parametrize(
+    ("n", "accept_encoding", "content_encoding"),
+    [
+        (20_000, "gzip", "gzip"),
+        (20_000, "identity", None),
+        (10, "gzip", None),
+    ],
+)
+def test_factorial_compression(n: int, accept_encoding: str, content_encoding: str | None):
+    response = requests.get(
+        BASE_URL + "/factorial",
+        params={"n": n},
+        headers={"Accept-Encoding": accept_encoding},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers.get("content-encoding") == content_encoding
+    assert response.text == f'{{"result": {Decimal(math.factorial(n))}}}'
+
+
+def test_metrics():
+    requests.get(BASE_URL + "/fibonacci/10")
+    response = requests.get(BASE_URL + "/metrics")
+
+    assert response.status_code == HTTPStatus.OK
+    assert 'route="/fibonacci/{n:int}"' in response.text
@@ -0,0 +1,136 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Optional, Protocol, TypeVar
+
+from pydantic import BaseModel
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+class CacheBackend(Protocol):
+    """Store shared by all workers, e.g. Redis or memcached."""
+
+    async def get(self, key: str) -> Optional[bytes]: ...
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None: ...
+
+    async def delete(self, key: str) -> None: ...
+
+
+class InMemoryBackend:
+    """Process-local CacheBackend, a stand-in for a shared store in tests."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.data: dict[str, tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None or entry[0] <= self.clock():
+            self.data.pop(key, None)
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.data[key] = (self.clock() + ttl, value)
+
+    async def delete(self, key: str) -> None:
+        self.data.pop(key, None)
+
+
+class ModelCache(Generic[ModelT]):
+    """
+    Size and TTL bounded LRU cache of pydantic snapshots.
+
+    With a shared backend, entries are also stored there as JSON, and
+    invalidation removes them for every worker. Each worker still keeps its
+    own copies, but for at most `local_ttl` seconds, which bounds how long it
+    can serve a snapshot another worker invalidated.
+
+    A miss is filled with `set(key, value, generation)`, where `generation`
+    was taken before loading the value. If this worker invalidated the key
+    in between, the loaded value may predate the change and is dropped.
+    """
+
+    def __init__(
+            self,
+            model: type[ModelT],
+            prefix: str,
+            maxsize: int,
+            ttl: float,
+            backend: Optional[CacheBackend] = None,
+            local_ttl: Optional[float] = None,
+            clock: Callable[[], float] = time.monotonic
+        ):
+        self.model = model
+        self.prefix = prefix
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self.local_ttl = ttl if local_ttl is None else min(local_ttl, ttl)
+        self.clock = clock
+        self._entries: OrderedDict[str, tuple[float, ModelT]] = OrderedDict()
+        # Generation of the latest invalidation per key, the oldest are
+        # forgotten past maxsize and `_forgotten` stands in for them
+        self._generation = 0
+        self._invalidated: OrderedDict[str, int] = OrderedDict()
+        self._forgotten = 0
+
+    def _key(self, key) -> str:
+        return f"{self.prefix}:{key}"
+
+    def _local_ttl(self) -> float:
+        return self.local_ttl if self.backend is not None else self.ttl
+
+    def _store_locally(self, key: str, value: ModelT) -> None:
+        self._entries[key] = (self.clock() + self._local_ttl(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def get(self, key) -> Optional[ModelT]:
+        """Get a snapshot, or None if it is not cached or has expired."""
+        key = self._key(key)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > self.clock():
+                self._entries.move_to_end(key)
+                return entry[1]
+            del self._entries[key]
+
+        if self.backend is None:
+            return None
+        raw = await self.backend.get(key)
+        if raw is None:
+            return None
+        value = self.model.model_validate_json(raw)
+        self._store_locally(key, value)
+        return value
+
+    def generation(self) -> int:
+        """Token to take before loading a value for `set`."""
+        return self._generation
+
+    async def set(self, key, value: ModelT, generation: Optional[int] = None) -> None:
+        """Store a snapshot, unless the key was invalidated since `generation`."""
+        key = self._key(key)
+        if generation is not None and self._invalidated.get(key, self._forgotten) > generation:
+            return
+        self._store_locally(key, value)
+        if self.backend is not None:
+            await self.backend.set(key, value.model_dump_json().encode(), self.ttl)
+
+    async def invalidate(self, key) -> None:
+        key = self._key(key)
+        self._generation += 1
+        self._invalidated[key] = self._generation
+        self._invalidated.move_to_end(key)
+        while len(self._invalidated) > self.maxsize:
+            _, self._forgotten = self._invalidated.popitem(last=False)
+        self._entries.pop(key, None)
+        if self.backend is not None:
+            await self.backend.delete(key)
+
+    def clear(self) -> None:
+        """Drop the local copies, the shared backend is left as is."""
+        self._entries.clear()
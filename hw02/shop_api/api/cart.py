@@ -1,110 +1,199 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Response
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from typing import List, Optional
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import OrderedDict
+from typing import List, Literal, Optional, Union
 from http import HTTPStatus
 
 from db.database import get_db
-from db.models.item import ItemModel, find_item
+from db.models.change_counter import table_versions
 from db.models.cart import (
     CartModel,
-    CartItemModel,
     create_cart,
     add_item_to_cart,
-    find_cart
+    add_items_to_cart,
+    build_cart_rows,
+    find_cart_row,
+    load_cart_rows
 )
 from api.schemas.cart import (
-    CartItem,
+    CartItemAdd,
     CartWithItems,
-    CartList
+    CartList,
+    CartRow,
+    CartListRow,
+    MAX_QUANTITY
 )
 
-from api.item import get_item
+from api.pagination import paginate, sort_keys
+from api.http_cache import conditional_response, make_etag
+from api.responses import ResponseSerializer
 
 router = APIRouter()
 
+cart_serializer = ResponseSerializer(CartRow)
+cart_list_serializer = ResponseSerializer(List[CartRow])
+cart_page_serializer = ResponseSerializer(CartListRow)
+
+# Cart counts per filter set, reused while the carts table version is unchanged
+CART_COUNT_CACHE_SIZE = 256
+_cart_counts: OrderedDict = OrderedDict()
+
+# Orderings of list_carts, each backed by an index
+CartSort = Literal[
+    "id", "-id", "total_price", "-total_price", "total_quantity", "-total_quantity"
+]
+CART_SORT_COLUMNS = {
+    "id": CartModel.id,
+    "total_price": CartModel.total_price,
+    "total_quantity": CartModel.total_quantity,
+}
+
+
+async def count_carts(filters: list, filters_key: tuple, db: AsyncSession) -> int:
+    """Count the carts matched by `filters`, cached until the next cart write."""
+    version = await table_versions(db, [CartModel.__tablename__])
+    cached = _cart_counts.get(filters_key)
+    if cached is not None and cached[0] == version:
+        _cart_counts.move_to_end(filters_key)
+        return cached[1]
+
+    total = await db.scalar(select(func.count()).select_from(CartModel).where(*filters))
+    _cart_counts[filters_key] = (version, total)
+    _cart_counts.move_to_end(filters_key)
+    if len(_cart_counts) > CART_COUNT_CACHE_SIZE:
+        _cart_counts.popitem(last=False)
+    return total
+
 @router.post("/cart", response_model=CartWithItems, status_code=HTTPStatus.CREATED)
-async def create_new_cart(response: Response, db: Session = Depends(get_db)):
+async def create_new_cart(response: Response, db: AsyncSession = Depends(get_db)):
     """Create a new cart"""
-    new_cart = create_cart(db)
-    cart_data = new_cart.to_pydantic()
+    new_cart = await create_cart(db)
+    cart_row, = build_cart_rows([(new_cart.id, new_cart.total_price)], [])
 
     # Set the Location header
     response.headers["Location"] = f"/cart/{new_cart.id}"
 
-    return cart_data
+    return cart_serializer.response(cart_row, response, HTTPStatus.CREATED)
 
 @router.get("/cart/{cart_id}", response_model=CartWithItems, status_code=HTTPStatus.OK)
-async def get_cart(cart_id: int, db: Session = Depends(get_db)):
+async def get_cart(
+        cart_id: int,
+        request: Request,
+        response: Response,
+        db: AsyncSession = Depends(get_db)
+    ):
     """Get a cart by id"""
-    cart = find_cart(cart_id, db)
+    cart = await find_cart_row(cart_id, db)
     if not cart:
         raise HTTPException(status_code=404, detail="Cart not found")
 
-    return cart.to_pydantic()
+    # Revalidation only needs the cart row, the lines are loaded on a miss
+    etag = make_etag("cart", cart.id, cart.version)
+    not_modified = conditional_response(request, response, etag, cart.updated_at)
+    if not_modified is not None:
+        return not_modified
 
-@router.get("/cart", response_model=List[CartWithItems], status_code=HTTPStatus.OK)
+    cart_row, = await load_cart_rows(db, [cart])
+    return cart_serializer.response(cart_row, response)
+
+@router.get("/cart", response_model=Union[List[CartWithItems], CartList], status_code=HTTPStatus.OK)
 async def list_carts(
+        response: Response,
+        cursor: Optional[str] = None,
         offset: int = Query(0, ge=0),
         limit: int = Query(10, gt=0),
         min_price: Optional[float] = Query(None, ge=0),
         max_price: Optional[float] = Query(None, ge=0),
         min_quantity: Optional[int] = Query(None, ge=0),
         max_quantity: Optional[int] = Query(None, ge=0),
-        db: Session = Depends(get_db)
+        with_total: bool = False,
+        sort: CartSort = "id",
+        db: AsyncSession = Depends(get_db)
     ):
-    """Get a list of carts with optional filtering."""
-    # Base query
-    query = db.query(CartModel)
-
-    # Subquery for total price and quantity
-    subquery = db.query(
-        CartItemModel.cart_id,
-        func.sum(CartItemModel.quantity * ItemModel.price).label("total_price"),
-        func.sum(CartItemModel.quantity).label("total_quantity")
-    ).join(ItemModel, CartItemModel.item_id == ItemModel.id
-    ).filter(ItemModel.deleted == False
-    ).group_by(CartItemModel.cart_id
-    ).subquery()
-
-    # Join with the main query
-    query = query.outerjoin(subquery, CartModel.id == subquery.c.cart_id)
-
-    # Apply filters
+    """
+    Get a list of carts with optional filtering.
+
+    With `with_total` the page is wrapped in a CartList together with the
+    number of carts matching the filters.
+    """
+    # Base query, cart lines and items are loaded in bulk for the whole page
+    query = select(CartModel.id, CartModel.total_price, CartModel.total_quantity)
+
+    # Apply filters on the stored cart totals
     filters = []
     if min_price is not None:
-        filters.append(subquery.c.total_price >= min_price)
+        filters.append(CartModel.total_price >= min_price)
     if max_price is not None:
-        filters.append(subquery.c.total_price <= max_price)
+        filters.append(CartModel.total_price <= max_price)
     if min_quantity is not None:
-        filters.append(subquery.c.total_quantity >= min_quantity)
+        filters.append(CartModel.total_quantity >= min_quantity)
     if max_quantity is not None:
-        filters.append(subquery.c.total_quantity <= max_quantity)
+        filters.append(CartModel.total_quantity <= max_quantity)
 
-    if filters:
-        query = query.filter(and_(*filters))
+    query = query.where(*filters)
 
     # Execute query
-    total = query.count()
-    carts = query.offset(offset).limit(limit).all()
+    keys, descending = sort_keys(sort, CART_SORT_COLUMNS, CartModel.id)
+    carts = await paginate(
+        db, query, keys, response, cursor, offset, limit,
+        scalars=False, descending=descending
+    )
 
-    # Convert to Pydantic models
-    cart_list = [cart.to_pydantic() for cart in carts]
+    # Build response rows
+    cart_list = await load_cart_rows(db, carts)
 
-    return cart_list
+    if with_total:
+        filters_key = (min_price, max_price, min_quantity, max_quantity)
+        total = await count_carts(filters, filters_key, db)
+        return cart_page_serializer.response({"carts": cart_list, "total": total}, response)
+
+    return cart_list_serializer.response(cart_list, response)
 
 @router.post("/cart/{cart_id}/add/{item_id}", response_model=CartWithItems)
 async def add_item_to_cart_endpoint(
         cart_id: int,
         item_id: int,
-        db: Session = Depends(get_db)
+        response: Response,
+        quantity: int = Query(1, ge=1, le=MAX_QUANTITY),
+        db: AsyncSession = Depends(get_db)
     ):
     """Add an item to a cart or increase its quantity if already present."""
-    # Handle errors for undefined ids
-    await get_cart(cart_id, db)
-    await get_item(item_id, db)
+    # Undefined ids are reported by the insert itself, no lookups up front
+    try:
+        added = await add_item_to_cart(db, cart_id, item_id, quantity)
+    except IntegrityError:
+        raise HTTPException(status_code=404, detail="Cart not found")
+    if not added:
+        raise HTTPException(status_code=404, detail="Item not found")
 
+    cart_row, = await load_cart_rows(db, [await find_cart_row(cart_id, db)])
+    return cart_serializer.response(cart_row, response)
 
-    cart_item = add_item_to_cart(db, cart_id, item_id)
+@router.post("/cart/{cart_id}/items", response_model=CartWithItems)
+async def add_items_to_cart_endpoint(
+        cart_id: int,
+        response: Response,
+        lines: List[CartItemAdd] = Body(..., min_length=1),
+        db: AsyncSession = Depends(get_db)
+    ):
+    """Add several items to a cart in one transaction."""
+    quantities = {}
+    for line in lines:
+        quantities[line.item_id] = quantities.get(line.item_id, 0) + line.quantity
+        if quantities[line.item_id] > MAX_QUANTITY:
+            raise HTTPException(
+                status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+                detail=f"Quantity of item {line.item_id} must not exceed {MAX_QUANTITY}"
+            )
+
+    try:
+        added = await add_items_to_cart(db, cart_id, quantities)
+    except IntegrityError:
+        raise HTTPException(status_code=404, detail="Cart not found")
+    if not added:
+        raise HTTPException(status_code=404, detail="Item not found")
 
-    return cart_item.cart.to_pydantic()
+    cart_row, = await load_cart_rows(db, [await find_cart_row(cart_id, db)])
+    return cart_serializer.response(cart_row, response)
@@ -0,0 +1,62 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http import HTTPStatus
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag from the parts identifying a representation."""
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def _as_utc(moment: datetime) -> datetime:
+    # SQLite hands back naive datetimes, they are stored in UTC
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def is_not_modified(
+        request: Request,
+        etag: str,
+        last_modified: Optional[datetime] = None
+    ) -> bool:
+    """Check whether the client copy is current, If-None-Match takes precedence."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = _as_utc(parsedate_to_datetime(if_modified_since))
+    except (TypeError, ValueError):
+        return False
+    return _as_utc(last_modified).replace(microsecond=0) <= since
+
+
+def conditional_response(
+        request: Request,
+        response: Response,
+        etag: str,
+        last_modified: Optional[datetime] = None
+    ) -> Optional[Response]:
+    """
+    Attach validators to `response`.
+
+    Returns a 304 response to send instead when the client copy is current,
+    so the caller can skip loading and serializing the body.
+    """
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
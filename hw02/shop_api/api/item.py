@@ -1,82 +1,198 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+import hashlib
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request, Response
 from http import HTTPStatus
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic import ValidationError
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.database import get_db
 from db.models.item import ItemModel, find_item
-from api.schemas.item import ItemCreate, ItemUpdate, ItemInDB
+from db.models.cart import refresh_cart_totals
+from db.models.change_counter import table_versions
+from db.search import search_items, search_terms
+from api.schemas.item import ItemCreate, ItemUpdate, ItemInDB, ItemRow, ItemSnapshot
+from api.pagination import paginate, sort_keys
+from api.cache import ModelCache
+from api.http_cache import conditional_response, make_etag
+from api.responses import ResponseSerializer
+from config import settings
 
 router = APIRouter()
 
+# Item snapshots served by get_item, invalidated by every item write
+item_cache = ModelCache(
+    ItemSnapshot,
+    prefix="item",
+    maxsize=settings.ITEM_CACHE_SIZE,
+    ttl=settings.ITEM_CACHE_TTL,
+    local_ttl=settings.ITEM_CACHE_LOCAL_TTL
+)
+
+item_serializer = ResponseSerializer(ItemInDB)
+item_list_serializer = ResponseSerializer(List[ItemRow])
+
+# Columns of ItemRow, list_items reads them as plain rows instead of ORM objects
+ITEM_COLUMNS = (ItemModel.name, ItemModel.price, ItemModel.deleted, ItemModel.id)
+
+# Orderings of list_items, each backed by an index
+ItemSort = Literal["id", "-id", "price", "-price"]
+ITEM_SORT_COLUMNS = {"id": ItemModel.id, "price": ItemModel.price}
+
+
+def item_filters(
+        min_price: Optional[float],
+        max_price: Optional[float],
+        show_deleted: bool
+    ) -> list:
+    """WHERE clauses shared by list_items and search_items_endpoint."""
+    filters = []
+    if not show_deleted:
+        filters.append(ItemModel.deleted == False)
+    if min_price is not None:
+        filters.append(ItemModel.price >= min_price)
+    if max_price is not None:
+        filters.append(ItemModel.price <= max_price)
+    return filters
+
+
 @router.post("/item", response_model=ItemInDB, status_code=HTTPStatus.CREATED)
-async def create_item(item: ItemCreate, db: Session = Depends(get_db)) -> ItemModel:
+async def create_item(item: ItemCreate, db: AsyncSession = Depends(get_db)) -> ItemModel:
     """Create a new item"""
     db_item = ItemModel(**item.model_dump())
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    await db.commit()
+    await db.refresh(db_item)
     return db_item
 
+@router.post("/item/batch", response_model=List[ItemInDB], status_code=HTTPStatus.CREATED)
+async def create_items(
+        items: List[ItemCreate] = Body(..., min_length=1),
+        db: AsyncSession = Depends(get_db)
+    ) -> List[ItemModel]:
+    """Create several items in one transaction"""
+    # Multi-row INSERT ... RETURNING, rows come back in the order they were sent
+    db_items = (await db.scalars(
+        insert(ItemModel).returning(ItemModel, sort_by_parameter_order=True),
+        [item.model_dump() for item in items]
+    )).all()
+    await db.commit()
+    return db_items
+
+@router.get("/item/search", response_model=List[ItemInDB])
+async def search_items_endpoint(
+        response: Response,
+        q: str = Query(..., min_length=1),
+        offset: int = Query(0, ge=0),
+        limit: int = Query(10, gt=0),
+        min_price: Optional[float] = Query(None, gt=0),
+        max_price: Optional[float] = Query(None, gt=0),
+        show_deleted: bool = False,
+        db: AsyncSession = Depends(get_db)
+    ):
+    """Search items by name prefixes, best matches first"""
+    terms = search_terms(q)
+    if not terms:
+        raise HTTPException(
+            status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+            detail="Search query has no words"
+        )
+
+    query = select(*ITEM_COLUMNS).where(*item_filters(min_price, max_price, show_deleted))
+
+    query = search_items(query, terms, db.get_bind().dialect.name)
+    rows = await db.execute(query.offset(offset).limit(limit))
+    return item_list_serializer.response([row._asdict() for row in rows], response)
+
 @router.get("/item/{item_id}", response_model=ItemInDB)
-async def get_item(item_id: int, db: Session = Depends(get_db)) -> ItemModel:
+async def get_item(
+        item_id: int,
+        request: Request,
+        response: Response,
+        db: AsyncSession = Depends(get_db)
+    ) -> ItemInDB:
     """Get an item by id"""
-    item = find_item(item_id, db)
-    if not item or item.deleted:
+    item = await item_cache.get(item_id)
+    if item is None:
+        # Taken before the read, an update committed meanwhile drops the fill
+        generation = item_cache.generation()
+        db_item = await find_item(item_id, db)
+        if not db_item:
+            raise HTTPException(status_code=404, detail="Item not found")
+        item = ItemSnapshot.model_validate(db_item, from_attributes=True)
+        await item_cache.set(item_id, item, generation)
+
+    if item.deleted:
         raise HTTPException(status_code=404, detail="Item not found")
-    return item
+
+    etag = make_etag("item", item.id, item.version)
+    not_modified = conditional_response(request, response, etag, item.updated_at)
+    if not_modified is not None:
+        return not_modified
+    return item_serializer.response(item, response)
 
 @router.get("/item", response_model=List[ItemInDB])
 async def list_items(
+        request: Request,
+        response: Response,
+        cursor: Optional[str] = None,
         offset: int = Query(0, ge=0),
         limit: int = Query(10, gt=0),
         min_price: Optional[float] = Query(None, gt=0),
         max_price: Optional[float] = Query(None, gt=0),
         show_deleted: bool = False,
-        db: Session = Depends(get_db)
+        sort: ItemSort = "id",
+        db: AsyncSession = Depends(get_db)
     ):
     """Get a list of items with optional filtering"""
-    query = db.query(ItemModel)
-
-    if not show_deleted:
-        query = query.filter(ItemModel.deleted == False)
-
-    if min_price is not None:
-        query = query.filter(ItemModel.price >= min_price)
-
-    if max_price is not None:
-        query = query.filter(ItemModel.price <= max_price)
-
-    return query.offset(offset).limit(limit).all()
+    # The page is fully determined by the query string and the table version
+    version, = await table_versions(db, [ItemModel.__tablename__])
+    query_hash = hashlib.blake2b(
+        str(sorted(request.query_params.multi_items())).encode(), digest_size=8
+    ).hexdigest()
+    etag = make_etag("items", version, query_hash)
+    not_modified = conditional_response(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
+    query = select(*ITEM_COLUMNS).where(*item_filters(min_price, max_price, show_deleted))
+
+    keys, descending = sort_keys(sort, ITEM_SORT_COLUMNS, ItemModel.id)
+    rows = await paginate(
+        db, query, keys, response, cursor, offset, limit,
+        scalars=False, descending=descending
+    )
+    return item_list_serializer.response([row._asdict() for row in rows], response)
 
 @router.put("/item/{item_id}", response_model=ItemInDB)
 async def update_item(
         item_id: int,
         item: ItemCreate,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
     ) -> ItemModel:
     """Replace an existing item"""
-    db_item = find_item(item_id, db)
+    db_item = await find_item(item_id, db)
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
 
     for key, value in item.model_dump().items():
         setattr(db_item, key, value)
 
-    db.commit()
-    db.refresh(db_item)
+    await refresh_cart_totals(db, item_id=item_id)
+    await db.commit()
+    await item_cache.invalidate(item_id)
+    await db.refresh(db_item)
     return db_item
 
 @router.patch("/item/{item_id}", response_model=ItemInDB)
 async def partial_update_item(
         item_id: int,
         item: ItemUpdate,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
     ) -> ItemModel:
     """Partially updae an item"""
-    db_item = find_item(item_id, db)
+    db_item = await find_item(item_id, db)
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
 
@@ -95,18 +211,22 @@ async def partial_update_item(
     for key, value in item_data.items():
         setattr(db_item, key, value)
 
-    db.commit()
-    db.refresh(db_item)
+    await refresh_cart_totals(db, item_id=item_id)
+    await db.commit()
+    await item_cache.invalidate(item_id)
+    await db.refresh(db_item)
     return db_item
 
 @router.delete("/item/{item_id}", response_model=ItemInDB)
-async def delete_item(item_id: int, db: Session = Depends(get_db)) -> ItemModel:
+async def delete_item(item_id: int, db: AsyncSession = Depends(get_db)) -> ItemModel:
     """Mark an item as deleted"""
-    db_item = find_item(item_id, db)
+    db_item = await find_item(item_id, db)
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
 
     db_item.deleted = True
-    db.commit()
-    db.refresh(db_item)
+    await refresh_cart_totals(db, item_id=item_id)
+    await db.commit()
+    await item_cache.invalidate(item_id)
+    await db.refresh(db_item)
     return db_item
@@ -0,0 +1,86 @@
+import base64
+import binascii
+import json
+from http import HTTPStatus
+from typing import Any, Mapping, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Pack the sort key of the last row of a page into an opaque token."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list[Any]:
+    """Unpack a cursor token, raising 422 if it was not issued by us."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(
+            status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+            detail="Invalid cursor"
+        )
+    return values
+
+
+def sort_keys(sort: str, columns: Mapping[str, Any], unique_key) -> tuple[list, bool]:
+    """
+    Map a sort parameter such as "-price" to key columns and a direction.
+
+    `unique_key` is appended to break ties, so the keys identify a row.
+    """
+    column = columns[sort.removeprefix("-")]
+    keys = [column] if column is unique_key else [column, unique_key]
+    return keys, sort.startswith("-")
+
+
+async def paginate(
+        db: AsyncSession,
+        query: Select,
+        keys: Sequence,
+        response: Response,
+        cursor: Optional[str],
+        offset: int,
+        limit: int,
+        scalars: bool = True,
+        descending: bool = False
+    ) -> list:
+    """
+    Fetch one page of `query` ordered by the unique column tuple `keys`,
+    ascending or `descending`.
+
+    With a cursor the page starts right after the row it points at, so it
+    is found through the index instead of skipping `offset` rows. When the
+    page is full, the cursor for the next one is sent in X-Next-Cursor.
+    Returns the first column of each row, or whole rows if not `scalars`.
+    """
+    if descending:
+        query = query.order_by(*(key.desc() for key in keys))
+    else:
+        query = query.order_by(*keys)
+
+    if cursor is not None:
+        after = decode_cursor(cursor, len(keys))
+        if descending:
+            query = query.where(tuple_(*keys) < tuple_(*after))
+        else:
+            query = query.where(tuple_(*keys) > tuple_(*after))
+
+    result = await db.execute(query.offset(offset).limit(limit))
+    rows = result.scalars().all() if scalars else result.all()
+
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            [getattr(last, key.key) for key in keys]
+        )
+    return rows
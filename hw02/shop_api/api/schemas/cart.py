@@ -1,7 +1,11 @@
 from pydantic import BaseModel, Field, computed_field
 from typing import List, Optional
+from typing_extensions import TypedDict
 from .item import ItemInDB
 
+# Largest quantity added at once, the int32 range of an INTEGER column
+MAX_QUANTITY = 2**31 - 1
+
 class CartItem(BaseModel):
     # CartItem properties
     quantity: int = Field(ge=1)
@@ -12,6 +16,11 @@ class CartItem(BaseModel):
     price: float
     available: bool
 
+class CartItemAdd(BaseModel):
+    """Schema for adding an item to a cart"""
+    item_id: int
+    quantity: int = Field(default=1, ge=1, le=MAX_QUANTITY)
+
 class CartWithItems(BaseModel):
     """Schema for Cart with full Item details"""
     id: int
@@ -22,3 +31,24 @@ class CartList(BaseModel):
     """Schema for list of Carts"""
     carts: List[CartWithItems]
     total: int
+
+
+# Plain-dict mirrors of the schemas above, in the same field order. Responses
+# built from database rows use them with pre-built serializers, which skips
+# validating data the database already guarantees.
+
+class CartItemRow(TypedDict):
+    quantity: int
+    id: int
+    name: str
+    price: float
+    available: bool
+
+class CartRow(TypedDict):
+    id: int
+    price: float
+    items: List[CartItemRow]
+
+class CartListRow(TypedDict):
+    carts: List[CartRow]
+    total: int
@@ -1,4 +1,6 @@
+from datetime import datetime
 from typing import Optional
+from typing_extensions import TypedDict
 from pydantic import BaseModel, Field
 
 class ItemBase(BaseModel):
@@ -23,3 +25,17 @@ class ItemInDB(ItemBase):
 
     class ConfigDict:
         from_attributes = True
+
+
+class ItemRow(TypedDict):
+    """Plain-dict mirror of ItemInDB for responses built from database rows"""
+    name: str
+    price: float
+    deleted: bool
+    id: int
+
+
+class ItemSnapshot(ItemInDB):
+    """Item with its validators, the body sent is still ItemInDB"""
+    version: int
+    updated_at: Optional[datetime] = None
@@ -0,0 +1,194 @@
+"""Latency and throughput of every shop endpoint on generated data.
+
+Seeds a database with db.seed_db, then sends a fixed number of requests
+to each endpoint in turn from concurrent clients over httpx's
+ASGITransport, so the numbers cover the app and the database but not the
+network or the ASGI server. Request targets come from a seeded RNG, so
+runs with the same arguments send the same requests.
+
+Reports p50/p99 latency, requests per second, and responses with status
+400 or above for each endpoint. --json writes the same numbers to a file
+for comparing runs.
+
+Run from hw02/shop_api:
+
+    python -m benchmarks.load --items 100000 --carts 20000 --requests 1000 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+from typing import Callable
+
+import httpx
+from sqlalchemy import select
+
+from benchmarks.scratch import run_with_client, scratch_app
+
+SEARCH_WORDS = ["red", "blue", "dark", "light", "green", "white", "gold", "sea"]
+
+Request = dict  # keyword arguments for httpx.AsyncClient.request
+
+
+def scenarios(item_ids: list[int], carts: int) -> dict[str, Callable[[random.Random], Request]]:
+    """
+    Request factories per endpoint, reads first.
+
+    Items are picked among the available `item_ids`. PUT and PATCH target
+    the first half of them and DELETE the second half, so deletions do not
+    turn later requests into 404s.
+    """
+    updated, deleted = item_ids[:len(item_ids) // 2], item_ids[len(item_ids) // 2:]
+
+    def item_id(rng: random.Random) -> int:
+        return rng.choice(item_ids)
+
+    def cart_id(rng: random.Random) -> int:
+        return rng.randint(1, carts)
+
+    def new_item(rng: random.Random) -> dict:
+        return {"name": f"bench {rng.choice(SEARCH_WORDS)}", "price": round(rng.uniform(1, 500), 2)}
+
+    return {
+        "GET /": lambda rng: {"method": "GET", "url": "/"},
+        "GET /item/{id}": lambda rng: {"method": "GET", "url": f"/item/{item_id(rng)}"},
+        "GET /item": lambda rng: {
+            "method": "GET", "url": "/item",
+            "params": {"sort": rng.choice(["id", "-price"]), "limit": 20},
+        },
+        "GET /item?min_price": lambda rng: {
+            "method": "GET", "url": "/item",
+            "params": {"min_price": (low := rng.uniform(1, 100)), "max_price": low + 5, "limit": 20},
+        },
+        "GET /item/search": lambda rng: {
+            "method": "GET", "url": "/item/search", "params": {"q": rng.choice(SEARCH_WORDS)},
+        },
+        "GET /cart/{id}": lambda rng: {"method": "GET", "url": f"/cart/{cart_id(rng)}"},
+        "GET /cart": lambda rng: {
+            "method": "GET", "url": "/cart",
+            "params": {"sort": rng.choice(["id", "-total_price"]), "limit": 20},
+        },
+        "GET /cart?with_total": lambda rng: {
+            "method": "GET", "url": "/cart",
+            "params": {"min_quantity": rng.randint(0, 20), "with_total": True, "limit": 20},
+        },
+        "POST /item": lambda rng: {"method": "POST", "url": "/item", "json": new_item(rng)},
+        "POST /item/batch": lambda rng: {
+            "method": "POST", "url": "/item/batch", "json": [new_item(rng) for _ in range(10)],
+        },
+        "POST /cart": lambda rng: {"method": "POST", "url": "/cart"},
+        "POST /cart/{id}/add/{item_id}": lambda rng: {
+            "method": "POST", "url": f"/cart/{cart_id(rng)}/add/{item_id(rng)}",
+        },
+        "POST /cart/{id}/items": lambda rng: {
+            "method": "POST", "url": f"/cart/{cart_id(rng)}/items",
+            "json": [{"item_id": item_id(rng), "quantity": rng.randint(1, 3)} for _ in range(5)],
+        },
+        "PUT /item/{id}": lambda rng: {
+            "method": "PUT", "url": f"/item/{rng.choice(updated)}", "json": new_item(rng),
+        },
+        "PATCH /item/{id}": lambda rng: {
+            "method": "PATCH", "url": f"/item/{rng.choice(updated)}",
+            "json": {"price": round(rng.uniform(1, 500), 2)},
+        },
+        "DELETE /item/{id}": lambda rng: {
+            "method": "DELETE", "url": f"/item/{rng.choice(deleted)}",
+        },
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, requests: list[Request], concurrency: int) -> dict:
+    """Send `requests` from `concurrency` clients, return latency stats."""
+    pending = iter(requests)
+    timings: list[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        for request in pending:
+            started = time.perf_counter()
+            response = await client.request(**request)
+            timings.append(time.perf_counter() - started)
+            errors += response.status_code >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    percentiles = statistics.quantiles(timings, n=100, method="inclusive")
+    return {
+        "requests": len(timings),
+        "errors": errors,
+        "p50_ms": percentiles[49] * 1e3,
+        "p99_ms": percentiles[98] * 1e3,
+        "rps": len(timings) / elapsed,
+    }
+
+
+async def run(
+        client: httpx.AsyncClient,
+        factories: dict,
+        args: argparse.Namespace
+    ) -> dict[str, dict]:
+    rng = random.Random(args.seed)
+    results = {}
+    for name, factory in factories.items():
+        requests = [factory(rng) for _ in range(args.warmup + args.requests)]
+        await run_scenario(client, requests[:args.warmup], 1)
+        results[name] = await run_scenario(client, requests[args.warmup:], args.concurrency)
+        print(
+            f"{name:<32}{results[name]['requests']:>9}{results[name]['errors']:>8}"
+            f"{results[name]['p50_ms']:>10.2f}{results[name]['p99_ms']:>10.2f}"
+            f"{results[name]['rps']:>10.0f}",
+            flush=True
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--carts", type=int, default=2_000)
+    parser.add_argument("--cart-size", type=float, default=5)
+    parser.add_argument("--distribution", default="geometric")
+    parser.add_argument("--requests", type=int, default=500, help="timed requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    with scratch_app("load.db") as app:
+        from db.database import ItemModel, engine
+        from db.seed_db import generate_database, reset_database
+
+        reset_database()
+        generate_database(
+            engine,
+            items=args.items,
+            carts=args.carts,
+            cart_size=args.cart_size,
+            distribution=args.distribution,
+            seed=args.seed,
+        )
+        with engine.connect() as conn:
+            item_ids = list(conn.scalars(
+                select(ItemModel.id).where(ItemModel.deleted == False).order_by(ItemModel.id)
+            ))
+
+        print(f"{'endpoint':<32}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'rps':>10}")
+        results = run_with_client(
+            app, lambda client: run(client, scenarios(item_ids, args.carts), args)
+        )
+
+    if args.json:
+        report = {"args": {**vars(args), "json": str(args.json)}, "results": results}
+        args.json.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""The app on a throwaway database, driven in-process over ASGITransport."""
+
+import asyncio
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Awaitable, Callable, Iterator, TypeVar
+
+import httpx
+from fastapi import FastAPI
+
+T = TypeVar("T")
+
+
+@contextmanager
+def scratch_app(name: str) -> Iterator[FastAPI]:
+    """
+    Import the app bound to a temporary SQLite database named `name`.
+
+    The engines are created when db.database is first imported, so nothing
+    may import it before this, and only one scratch app fits in a process.
+    Import models and engines inside the block.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(directory) / name}"
+        from db.database import engine
+        from main import app
+
+        try:
+            yield app
+        finally:
+            engine.dispose()
+
+
+def run_with_client(app: FastAPI, scenario: Callable[[httpx.AsyncClient], Awaitable[T]]) -> T:
+    """Run `scenario` with a client of `app` on a fresh event loop."""
+    from db.database import async_engine
+
+    async def main() -> T:
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                return await scenario(client)
+        finally:
+            # The pool is bound to this loop, the next run gets a new one
+            await async_engine.dispose()
+
+    return asyncio.run(main())
@@ -0,0 +1,118 @@
+"""Per-item cost of building and serializing cart and item responses.
+
+Compares the validating path with the fast path:
+- Validating: schemas built from ORM objects with validation, then checked
+  again by FastAPI against response_model.
+- Fast: TypedDict rows built straight from SQL result rows and written by a
+  pre-built serializer.
+
+Run from hw02/shop_api:
+
+    python -m benchmarks.serialization
+"""
+
+import argparse
+import timeit
+from collections import namedtuple
+from typing import Callable, List
+
+from pydantic import TypeAdapter
+
+from api.responses import ResponseSerializer
+from api.schemas.cart import CartItem, CartRow, CartWithItems
+from api.schemas.item import ItemInDB, ItemRow
+from db.database import CartItemModel, CartModel, ItemModel
+from db.models.cart import build_cart_rows
+
+# Stand-in for SQLAlchemy result rows, which are named tuples as well
+ItemResultRow = namedtuple("ItemResultRow", ["name", "price", "deleted", "id"])
+
+
+def make_cart_lines(size: int) -> list[tuple]:
+    """Rows shaped like CART_LINE_COLUMNS."""
+    return [(1, i % 5 + 1, i, f"item {i}", i + 0.5, i % 10 == 0) for i in range(size)]
+
+
+def make_cart(lines: list[tuple]) -> CartModel:
+    cart = CartModel(id=1, total_price=0.0, cart_items=[])
+    for _, quantity, item_id, name, price, deleted in lines:
+        item = ItemModel(id=item_id, name=name, price=price, deleted=deleted)
+        cart.cart_items.append(CartItemModel(quantity=quantity, item=item))
+        cart.total_price += price * quantity
+    return cart
+
+
+def validated_cart(cart: CartModel) -> CartWithItems:
+    """The cart response built from ORM objects with validation"""
+    return CartWithItems(
+        id=cart.id,
+        price=cart.total_price,
+        items=[
+            CartItem(
+                quantity=cart_item.quantity,
+                id=cart_item.item.id,
+                name=cart_item.item.name,
+                price=cart_item.item.price,
+                available=not cart_item.item.deleted
+            )
+            for cart_item in cart.cart_items
+        ]
+    )
+
+
+def measure(func: Callable[[], object], size: int, repeat: int) -> float:
+    """Best per-item time in microseconds."""
+    number = max(1, 20_000 // size)
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return best / number / size * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cart-size", type=int, default=100)
+    parser.add_argument("--list-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cart_lines = make_cart_lines(args.cart_size)
+    cart = make_cart(cart_lines)
+    cart_adapter = TypeAdapter(CartWithItems)
+    cart_serializer = ResponseSerializer(CartRow)
+
+    item_rows = [
+        ItemResultRow(f"item {i}", i + 0.5, False, i) for i in range(args.list_size)
+    ]
+    item_models = [ItemModel(**row._asdict()) for row in item_rows]
+    item_list_adapter = TypeAdapter(List[ItemInDB])
+    item_list_serializer = ResponseSerializer(List[ItemRow])
+
+    cases = {
+        f"cart, {args.cart_size} items": (
+            args.cart_size,
+            # FastAPI re-validates the returned model before serializing it
+            lambda: cart_adapter.dump_json(cart_adapter.validate_python(validated_cart(cart))),
+            lambda: cart_serializer.adapter.dump_json(
+                build_cart_rows([(1, cart.total_price)], cart_lines)[0]
+            ),
+        ),
+        f"item list, {args.list_size} items": (
+            args.list_size,
+            lambda: item_list_adapter.dump_json(
+                item_list_adapter.validate_python(item_models, from_attributes=True)
+            ),
+            lambda: item_list_serializer.adapter.dump_json(
+                [row._asdict() for row in item_rows]
+            ),
+        ),
+    }
+
+    print(f"{'case':<24}{'validated, us/item':>20}{'fast, us/item':>16}{'speedup':>10}")
+    for name, (size, before, after) in cases.items():
+        assert before() == after(), name
+        slow = measure(before, size, args.repeat)
+        fast = measure(after, size, args.repeat)
+        print(f"{name:<24}{slow:>20.3f}{fast:>16.3f}{slow / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Latency of sorted top-N listings as the catalog grows.
+
+Seeds a scratch database in steps up to the largest size and, after each
+step, times the first page of GET /item and GET /cart under every sort.
+With index-backed ORDER BY the page is read off the index, so latency
+should stay roughly flat while the tables grow by orders of magnitude.
+
+Run from hw02/shop_api:
+
+    python -m benchmarks.top_n --sizes 10000 100000 1000000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+import httpx
+
+from benchmarks.scratch import run_with_client, scratch_app
+
+ITEM_SORTS = ["id", "-id", "price", "-price"]
+CART_SORTS = ["-id", "total_price", "-total_price", "-total_quantity"]
+BATCH_SIZE = 50_000
+
+
+def grow(engine, items, carts, start: int, stop: int) -> None:
+    """Insert rows with ids in [start, stop) into both tables."""
+    rng = random.Random(start)
+    with engine.begin() as conn:
+        for batch in range(start, stop, BATCH_SIZE):
+            ids = range(batch, min(batch + BATCH_SIZE, stop))
+            conn.execute(items.insert(), [
+                {"id": i, "name": f"item {i}", "price": round(rng.uniform(1, 1000), 2),
+                 "deleted": rng.random() < 0.05}
+                for i in ids
+            ])
+            conn.execute(carts.insert(), [
+                {"id": i, "total_price": round(rng.uniform(0, 10_000), 2),
+                 "total_quantity": rng.randint(0, 50)}
+                for i in ids
+            ])
+
+
+async def time_requests(client: httpx.AsyncClient, path: str, params: dict, repeat: int) -> float:
+    """Median latency in milliseconds."""
+    assert (await client.get(path, params=params)).status_code == 200
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await client.get(path, params=params)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1e3
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with scratch_app("top_n.db") as app:
+        from db.database import CartModel, ItemModel, engine
+
+        cases = [("/item", sort) for sort in ITEM_SORTS] + [("/cart", sort) for sort in CART_SORTS]
+        print(f"{'rows':>10}" + "".join(f"{path + ' ' + sort:>22}" for path, sort in cases))
+
+        seeded = 0
+        for size in sorted(args.sizes):
+            grow(engine, ItemModel.__table__, CartModel.__table__, seeded + 1, size + 1)
+            seeded = size
+
+            async def measure(client: httpx.AsyncClient) -> list[float]:
+                return [
+                    await time_requests(
+                        client, path, {"sort": sort, "limit": args.limit}, args.repeat
+                    )
+                    for path, sort in cases
+                ]
+
+            timings = run_with_client(app, measure)
+            print(f"{size:>10}" + "".join(f"{ms:>19.2f} ms" for ms in timings))
+
+
+if __name__ == "__main__":
+    main()
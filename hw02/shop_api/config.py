@@ -8,5 +8,24 @@ class Settings(BaseSettings):
     # Database settings
     DATABASE_URL: str = f"sqlite:///{BASE_DIR}/shop.db"
 
+    # Connection pool settings
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # SQLite pragmas applied to every new connection
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE: int = -64_000  # negative values are in KiB
+    SQLITE_BUSY_TIMEOUT: int = 5_000  # milliseconds
+    SQLITE_FOREIGN_KEYS: bool = True
+
+    # Item snapshot cache for GET /item/{id}
+    ITEM_CACHE_SIZE: int = 10_000
+    ITEM_CACHE_TTL: float = 60.0
+    ITEM_CACHE_LOCAL_TTL: float = 1.0  # used when a shared backend is set
+
 # Global settings
 settings = Settings()
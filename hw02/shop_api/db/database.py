@@ -1,21 +1,93 @@
-from sqlalchemy import create_engine
+from typing import AsyncIterator
+
+from sqlalchemy import Engine, QueuePool, create_engine, event, make_url
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from config import settings
 
 DATABASE_URL = "sqlite:///./shop.db"
 
-engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+# Async drivers used by the request handlers for each database backend
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+# Dialect inserts supporting ON CONFLICT, by backend name
+UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def async_database_url(url: str) -> str:
+    """Switch a database URL to the async driver of its backend."""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()]).render_as_string(
+        hide_password=False
+    )
+
+
+def engine_options(url: str) -> dict:
+    """Pool and driver options shared by the sync and async engines."""
+    url = make_url(url)
+    options = {
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    # In-memory SQLite gets a single shared connection instead of a QueuePool
+    if issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+        options["pool_size"] = settings.DB_POOL_SIZE
+        options["max_overflow"] = settings.DB_MAX_OVERFLOW
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Tune a new SQLite connection for concurrent readers and cheap commits."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE:d}")
+    cursor.execute(f"PRAGMA cache_size={settings.SQLITE_CACHE_SIZE:d}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT:d}")
+    cursor.execute(f"PRAGMA foreign_keys={'ON' if settings.SQLITE_FOREIGN_KEYS else 'OFF'}")
+    cursor.close()
+
+
+def configure_engine(engine: Engine) -> Engine:
+    """Install per-connection hooks for the engine's backend."""
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+# Synchronous engine for migrations, seeding and scripts
+engine = configure_engine(
+    create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for request handlers, so DB round trips do not block the event loop
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
+    **engine_options(async_database_url(settings.DATABASE_URL))
+)
+configure_engine(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 Base = declarative_base()
 # Import all models
-from .models import ItemModel, CartModel, CartItemModel
+from .models import ItemModel, CartModel, CartItemModel, ChangeCounterModel
 
 
-def get_db():
-    """Dependency to get DB session."""
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """Dependency to get an async DB session."""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,53 @@
+from sqlalchemy import Engine, inspect
+from sqlalchemy.schema import CreateColumn
+
+from db.database import Base
+from db.models.cart import cart_totals_update
+from db.search import install_search
+
+
+def _add_missing_columns(engine: Engine) -> set[str]:
+    """Add model columns missing from existing tables, return the table names."""
+    inspector = inspect(engine)
+    altered = set()
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                altered.add(table.name)
+    return altered
+
+
+def _create_missing_indexes(engine: Engine) -> None:
+    """Create model indexes missing from existing tables."""
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(engine)
+
+
+def migrate(engine: Engine) -> None:
+    """
+    Bring the database schema up to date with the models.
+
+    Creates missing tables, adds columns introduced since the database
+    was created, backfills derived data and creates missing indexes,
+    including the full-text index over item names.
+    """
+    Base.metadata.create_all(bind=engine)
+    altered = _add_missing_columns(engine)
+
+    if "carts" in altered:
+        with engine.begin() as conn:
+            conn.execute(cart_totals_update())
+
+    _create_missing_indexes(engine)
+
+    with engine.begin() as conn:
+        install_search(conn)
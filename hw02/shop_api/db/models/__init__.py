@@ -1,2 +1,3 @@
 from .item import ItemModel
 from .cart import CartModel, CartItemModel
+from .change_counter import ChangeCounterModel
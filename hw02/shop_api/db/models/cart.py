@@ -1,13 +1,16 @@
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, Session
-from sqlalchemy.ext.hybrid import hybrid_property
+from typing import Iterable, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import relationship
 from sqlalchemy import (
     ForeignKey,
     Column,
-    Integer, String, Float, Boolean
+    Integer, Float, Boolean, DateTime, Index, BigInteger,
+    case, cast, func, literal, select, update
 )
-from db.database import Base
-from api.schemas.cart import CartItem, CartWithItems
+from db.database import Base, UPSERT_INSERTS
+from db.models.item import ItemModel, utcnow
+from api.schemas.cart import CartRow, MAX_QUANTITY
 
 
 class CartModel(Base):
@@ -16,32 +19,18 @@ class CartModel(Base):
 
     id = Column(Integer, primary_key=True, index=True)
 
-    @hybrid_property
-    def total_price(self):
-        return sum(item.item.price * item.quantity
-                   for item in self.cart_items
-                   if not item.item.deleted)
+    # Denormalized totals over available items, kept up to date by
+    # refresh_cart_totals so filters and sorting can use an index
+    total_price = Column(Float, nullable=False, default=0.0, server_default="0", index=True)
+    total_quantity = Column(Integer, nullable=False, default=0, server_default="0", index=True)
+
+    # Bumped together with the totals whenever the cart or one of its items changes
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime(timezone=True), default=utcnow)
 
     # Relationship
     cart_items = relationship("CartItemModel", back_populates="cart")
 
-    def to_pydantic(self):
-        cart_items = [
-            CartItem(
-                quantity=cart_item.quantity,
-                id=cart_item.item.id,
-                name=cart_item.item.name,
-                price=cart_item.item.price,
-                available=not cart_item.item.deleted
-            )
-            for cart_item in self.cart_items
-        ]
-        return CartWithItems(
-            id=self.id,
-            price=self.total_price,
-            items=cart_items
-        )
-
 class CartItemModel(Base):
     """Association table for Cart and Item relationship."""
     __tablename__ = "cart_items"
@@ -55,46 +44,167 @@ class CartItemModel(Base):
     cart = relationship("CartModel", back_populates="cart_items")
     item = relationship("ItemModel", back_populates="cart_items")
 
-
-def find_cart(item_id: int, db: Session) -> CartModel:
-    """Get an item by ID."""
-    return (
-        db.query(CartModel)
-        .filter(CartModel.id == item_id)
-        .first()
+    __table_args__ = (
+        # Carts containing an item, for refreshing totals on item changes
+        Index("ix_cart_items_item_cart", item_id, cart_id),
+        # Covers the per-cart total aggregate without touching table rows
+        Index("ix_cart_items_cart_totals", cart_id, item_id, quantity),
     )
 
 
-def create_cart(db: Session) -> CartModel:
+# Columns of a cart line as served by the API
+CART_LINE_COLUMNS = (
+    CartItemModel.cart_id,
+    CartItemModel.quantity,
+    ItemModel.id,
+    ItemModel.name,
+    ItemModel.price,
+    ItemModel.deleted,
+)
+
+
+def build_cart_rows(carts: Iterable, lines: Iterable) -> list[CartRow]:
+    """Assemble response rows from (id, total_price) cart rows and CART_LINE_COLUMNS rows."""
+    rows = {cart_id: {"id": cart_id, "price": price, "items": []} for cart_id, price in carts}
+    for cart_id, quantity, item_id, name, price, deleted in lines:
+        rows[cart_id]["items"].append({
+            "quantity": quantity,
+            "id": item_id,
+            "name": name,
+            "price": price,
+            "available": not deleted,
+        })
+    return list(rows.values())
+
+
+async def load_cart_rows(db: AsyncSession, carts: Sequence) -> list[CartRow]:
+    """
+    Build response rows for `carts`, rows with id and total_price.
+
+    All of their lines are read in one query as plain rows, without
+    creating ORM objects.
+    """
+    carts = [(cart.id, cart.total_price) for cart in carts]
+    lines = []
+    if carts:
+        lines = await db.execute(
+            select(*CART_LINE_COLUMNS)
+            .join(ItemModel, CartItemModel.item_id == ItemModel.id)
+            .where(CartItemModel.cart_id.in_([cart_id for cart_id, _ in carts]))
+            .order_by(CartItemModel.cart_id, CartItemModel.item_id)
+        )
+    return build_cart_rows(carts, lines)
+
+
+async def find_cart_row(cart_id: int, db: AsyncSession):
+    """Get the id, totals and validators of a cart as a plain row."""
+    return (await db.execute(
+        select(CartModel.id, CartModel.total_price, CartModel.version, CartModel.updated_at)
+        .where(CartModel.id == cart_id)
+    )).first()
+
+
+async def create_cart(db: AsyncSession) -> CartModel:
     """Create a new cart."""
     db_cart = CartModel()
     db.add(db_cart)
-    db.commit()
-    db.refresh(db_cart)
+    await db.commit()
     return db_cart
 
 
-def add_item_to_cart(
-        db: Session,
+def _available_items_sum(column):
+    """Correlated subquery summing `column` over a cart's available items."""
+    return (
+        select(func.coalesce(func.sum(column), 0))
+        .select_from(CartItemModel)
+        .join(ItemModel, CartItemModel.item_id == ItemModel.id)
+        .where(CartItemModel.cart_id == CartModel.id)
+        .where(ItemModel.deleted == False)
+        .scalar_subquery()
+    )
+
+
+def cart_totals_update(cart_id: int | None = None, item_id: int | None = None):
+    """
+    Build the UPDATE recomputing stored cart totals.
+
+    Targets one cart, every cart containing an item, or all carts
+    when neither is given.
+    """
+    stmt = update(CartModel).values(
+        total_price=_available_items_sum(CartItemModel.quantity * ItemModel.price),
+        total_quantity=_available_items_sum(CartItemModel.quantity),
+        version=CartModel.version + 1,
+        updated_at=utcnow(),
+    )
+    if cart_id is not None:
+        stmt = stmt.where(CartModel.id == cart_id)
+    if item_id is not None:
+        stmt = stmt.where(CartModel.id.in_(
+            select(CartItemModel.cart_id).where(CartItemModel.item_id == item_id)
+        ))
+    return stmt.execution_options(synchronize_session=False)
+
+
+async def refresh_cart_totals(
+        db: AsyncSession,
+        cart_id: int | None = None,
+        item_id: int | None = None
+    ) -> None:
+    """Recompute stored cart totals in a single UPDATE, the caller commits."""
+    await db.flush()
+    await db.execute(cart_totals_update(cart_id, item_id))
+
+
+async def add_items_to_cart(
+        db: AsyncSession,
         cart_id: int,
-        item_id: int,
-        quantity: int = 1
-    ) -> CartItemModel:
-    """Add an item to a cart."""
-    cart_item = db.query(CartItemModel).filter(
-        CartItemModel.cart_id == cart_id,
-        CartItemModel.item_id == item_id
-    ).first()
-
-    if cart_item:
-        cart_item.quantity += 1
+        quantities: dict[int, int]
+    ) -> bool:
+    """
+    Add available items to a cart in one statement, `quantities` maps item ids to units.
+
+    Concurrent adds of the same item are summed by the database, capped at
+    MAX_QUANTITY. If any of the items does not exist or is deleted nothing
+    is added and False is returned. A missing cart fails the foreign key and
+    raises IntegrityError.
+    """
+    insert = UPSERT_INSERTS[db.get_bind().dialect.name]
+    if len(quantities) == 1:
+        quantity = literal(next(iter(quantities.values())), Integer)
     else:
-        cart_item = CartItemModel(
-            cart_id=cart_id,
-            item_id=item_id,
-            quantity=quantity
+        quantity = case(
+            {item_id: literal(units, Integer) for item_id, units in quantities.items()},
+            value=ItemModel.id
         )
-        db.add(cart_item)
-    db.commit()
-    db.refresh(cart_item)
-    return cart_item
+    available_items = select(
+        literal(cart_id, Integer), ItemModel.id, quantity
+    ).where(ItemModel.id.in_(list(quantities)), ItemModel.deleted == False)
+
+    stmt = insert(CartItemModel).from_select(
+        ["cart_id", "item_id", "quantity"], available_items
+    )
+    # Summed as BIGINT, so the cap applies before an INTEGER could overflow
+    summed = cast(CartItemModel.quantity, BigInteger) + stmt.excluded.quantity
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CartItemModel.cart_id, CartItemModel.item_id],
+        set_={"quantity": case((summed > MAX_QUANTITY, MAX_QUANTITY), else_=summed)}
+    )
+    result = await db.execute(stmt)
+    if result.rowcount != len(quantities):
+        await db.rollback()
+        return False
+
+    await refresh_cart_totals(db, cart_id=cart_id)
+    await db.commit()
+    return True
+
+
+async def add_item_to_cart(
+        db: AsyncSession,
+        cart_id: int,
+        item_id: int,
+        quantity: int = 1
+    ) -> bool:
+    """Add `quantity` units of an available item to a cart, see add_items_to_cart."""
+    return await add_items_to_cart(db, cart_id, {item_id: quantity})
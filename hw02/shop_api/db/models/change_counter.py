@@ -0,0 +1,76 @@
+from typing import Iterable
+
+from sqlalchemy import Column, Integer, String, event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db.database import Base, UPSERT_INSERTS
+
+
+class ChangeCounterModel(Base):
+    """
+    Per-table write counter.
+
+    Bumped once per committed transaction that touched the table, so caches
+    over a table can be keyed on its version instead of being invalidated.
+    """
+    __tablename__ = "change_counters"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+async def table_versions(db: AsyncSession, tables: Iterable[str]) -> tuple[int, ...]:
+    """Get the current versions of `tables` in one query."""
+    tables = list(tables)
+    rows = dict((await db.execute(
+        select(ChangeCounterModel.table_name, ChangeCounterModel.version)
+        .where(ChangeCounterModel.table_name.in_(tables))
+    )).all())
+    return tuple(rows.get(table, 0) for table in tables)
+
+
+def _touched_tables(session: Session) -> set[str]:
+    return session.info.setdefault("touched_tables", set())
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_tables(session, flush_context):
+    touched = _touched_tables(session)
+    for obj in session.new | session.deleted:
+        touched.add(obj.__table__.name)
+    for obj in session.dirty:
+        if session.is_modified(obj):
+            touched.add(obj.__table__.name)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_statements(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _touched_tables(orm_execute_state.session).add(orm_execute_state.statement.table.name)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_versions(session):
+    session.flush()
+    touched = _touched_tables(session)
+    touched.discard(ChangeCounterModel.__tablename__)
+    if not touched:
+        return
+
+    # One upsert, so concurrent first writes to a table cannot both insert
+    connection = session.connection()
+    insert = UPSERT_INSERTS[connection.dialect.name]
+    stmt = insert(ChangeCounterModel).values(
+        [{"table_name": table, "version": 1} for table in sorted(touched)]
+    )
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=[ChangeCounterModel.table_name],
+        set_={"version": ChangeCounterModel.version + 1}
+    ))
+    touched.clear()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_tables(session):
+    _touched_tables(session).clear()
@@ -1,8 +1,18 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean
-from sqlalchemy.orm import relationship, Session
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    Column, Integer, String, Float, Boolean, DateTime, Index,
+    insert_sentinel, literal_column, select
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import relationship
 from db.database import Base
 from api.schemas.item import ItemCreate
 
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
 class ItemModel(Base):
     """
     SQLAlchemy ORM model for Item.
@@ -14,19 +24,41 @@ class ItemModel(Base):
     price = Column(Float)
     deleted = Column(Boolean, default=False)
 
+    # Row version, bumped in the UPDATE itself, and modification time. Only
+    # validators are built from it, concurrent writes are not rejected
+    version = Column(
+        Integer, nullable=False, server_default="1", onupdate=literal_column("version") + 1
+    )
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+
+    # Client-side counter matching batched INSERT ... RETURNING rows to their
+    # parameters, SQLite returns ids in no guaranteed order
+    _sentinel = insert_sentinel()
+
     # Relationships
     cart_items = relationship("CartItemModel", back_populates="item")
 
+    __table_args__ = (
+        # Price ordering including deleted items
+        Index("ix_items_price", price),
+        # Price ranges over the available catalog, the list_items default
+        Index(
+            "ix_items_price_available",
+            price,
+            sqlite_where=deleted == False,
+            postgresql_where=deleted == False,
+        ),
+    )
+
 
-def find_item(item_id: int, db: Session) -> ItemModel:
+async def find_item(item_id: int, db: AsyncSession) -> ItemModel:
     """Get an item by ID."""
-    return (
-        db.query(ItemModel)
-        .filter(ItemModel.id == item_id)
-        .first()
+    return await db.scalar(
+        select(ItemModel)
+        .where(ItemModel.id == item_id)
     )
 
-def create_item(item: ItemCreate, db: Session) -> ItemModel:
+async def create_item(item: ItemCreate, db: AsyncSession) -> ItemModel:
     """Create a new item in the database."""
     db_item = ItemModel(
         name=item.name,
@@ -34,6 +66,5 @@ def create_item(item: ItemCreate, db: Session) -> ItemModel:
         deleted=item.deleted
     )
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    await db.commit()
     return db_item
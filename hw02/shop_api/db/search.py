@@ -0,0 +1,77 @@
+import re
+
+from sqlalchemy import Connection, Select, column, func, inspect, literal_column, table, text
+
+from db.models.item import ItemModel
+
+# External-content FTS5 index over item names, kept in sync by triggers so
+# every write path (ORM, bulk statements, raw SQL) updates it
+SQLITE_FTS_TABLE = "items_fts"
+SQLITE_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE {SQLITE_FTS_TABLE} USING fts5(
+        name, content='items', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE} (rowid, name) VALUES (new.id, new.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE} ({SQLITE_FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE OF name ON items BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE} ({SQLITE_FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO {SQLITE_FTS_TABLE} (rowid, name) VALUES (new.id, new.name);
+    END""",
+]
+
+# Postgres computes the document from the name, a GIN index serves the match
+POSTGRES_DOCUMENT = func.to_tsvector(literal_column("'simple'"), ItemModel.name)
+POSTGRES_FTS_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_items_name_fts ON items USING gin (to_tsvector('simple', name))",
+]
+
+items_fts = table(SQLITE_FTS_TABLE, column("rowid"), column("rank"), column(SQLITE_FTS_TABLE))
+
+
+def install_search(conn: Connection) -> None:
+    """Create the full-text index over item names, indexing existing items."""
+    if conn.dialect.name == "sqlite":
+        if inspect(conn).has_table(SQLITE_FTS_TABLE):
+            return
+        for statement in SQLITE_FTS_DDL:
+            conn.execute(text(statement))
+        conn.execute(text(f"INSERT INTO {SQLITE_FTS_TABLE} ({SQLITE_FTS_TABLE}) VALUES ('rebuild')"))
+    elif conn.dialect.name == "postgresql":
+        for statement in POSTGRES_FTS_DDL:
+            conn.execute(text(statement))
+
+
+def drop_search(conn: Connection) -> None:
+    """Drop the full-text index, e.g. before recreating the items table."""
+    if conn.dialect.name == "sqlite":
+        conn.execute(text(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}"))
+
+
+def search_terms(q: str) -> list[str]:
+    """Split a user query into words, dropping any search syntax."""
+    return re.findall(r"\w+", q)
+
+
+def search_items(query: Select, terms: list[str], dialect: str) -> Select:
+    """
+    Restrict an items query to names containing every term as a prefix.
+
+    Results are ordered by relevance, best first.
+    """
+    if dialect == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        return (
+            query.join(items_fts, items_fts.c.rowid == ItemModel.id)
+            .where(items_fts.c[SQLITE_FTS_TABLE].match(match))
+            .order_by(items_fts.c.rank, ItemModel.id)
+        )
+
+    match = func.to_tsquery(literal_column("'simple'"), " & ".join(f"{term}:*" for term in terms))
+    return (
+        query.where(POSTGRES_DOCUMENT.bool_op("@@")(match))
+        .order_by(func.ts_rank(POSTGRES_DOCUMENT, match).desc(), ItemModel.id)
+    )
@@ -1,23 +1,44 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
-from db.database import Base
+"""Seed the database with a sample catalog or a generated one.
+
+    python -m db.seed_db
+    python -m db.seed_db --items 100000 --carts 20000 --cart-size 8 --distribution geometric
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+
+from faker import Faker
+from sqlalchemy import Connection, Engine, Table, create_engine, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from db.database import Base, async_database_url, engine
+from db.search import drop_search, install_search
 from api.schemas.item import ItemCreate
 from config import settings
 
-from db.models.item import create_item
+from db.models.item import ItemModel, create_item
 from db.models.cart import (
     CartModel, CartItemModel,
-    create_cart, add_item_to_cart
+    create_cart, add_item_to_cart, cart_totals_update
 )
 
-def seed_database():
+CART_SIZE_DISTRIBUTIONS = ("fixed", "uniform", "geometric")
+
+async def seed_database():
     """Seed the database with sample data."""
     base = Base
-    engine = create_engine(settings.DATABASE_URL)
-    base.metadata.drop_all(engine)
-    base.metadata.create_all(engine)
+    engine = create_async_engine(async_database_url(settings.DATABASE_URL))
+    async with engine.begin() as conn:
+        await conn.run_sync(drop_search)
+        await conn.run_sync(base.metadata.drop_all)
+        await conn.run_sync(base.metadata.create_all)
+        await conn.run_sync(install_search)
 
-    with Session(engine) as session:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         # Create sample items
         items = [
             {"name": "Laptop", "price": 1000, "deleted": False},
@@ -32,20 +53,22 @@ def seed_database():
 
         created_items = []
         for item_data in items_obj:
-            item = create_item(item_data, session)
+            item = await create_item(item_data, session)
             created_items.append(item)
 
         # Create sample carts
-        cart1 = create_cart(session)
-        cart2 = create_cart(session)
+        cart1 = await create_cart(session)
+        cart2 = await create_cart(session)
 
         # Add items to carts
-        add_item_to_cart(session, cart1.id, created_items[0].id)
-        add_item_to_cart(session, cart1.id, created_items[1].id)
-        add_item_to_cart(session, cart2.id, created_items[2].id)
-        add_item_to_cart(session, cart2.id, created_items[3].id)
+        await add_item_to_cart(session, cart1.id, created_items[0].id)
+        await add_item_to_cart(session, cart1.id, created_items[1].id)
+        await add_item_to_cart(session, cart2.id, created_items[2].id)
+        await add_item_to_cart(session, cart2.id, created_items[3].id)
+
+        await session.commit()
 
-        session.commit()
+    await engine.dispose()
 
     print("Database seeded successfully!")
 
@@ -53,9 +76,166 @@ def seed_database():
 def reset_database():
     base = Base
     engine = create_engine(settings.DATABASE_URL)
-    base.metadata.drop_all(engine)
-    base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        drop_search(conn)
+        base.metadata.drop_all(conn)
+        base.metadata.create_all(conn)
+        install_search(conn)
+
+
+def cart_size_sampler(distribution: str, mean: float, rng: random.Random) -> Callable[[], int]:
+    """
+    Draw cart sizes averaging `mean` lines.
+
+    fixed: every cart has `mean` lines.
+    uniform: sizes spread evenly over [0, 2 * mean].
+    geometric: mostly small carts with a long tail of large ones.
+    """
+    if distribution == "fixed":
+        return lambda: round(mean)
+    if distribution == "uniform":
+        return lambda: rng.randint(0, round(2 * mean))
+    if distribution == "geometric":
+        if mean <= 0:
+            return lambda: 0
+        log_failure = math.log(mean / (mean + 1))
+        return lambda: int(math.log(1.0 - rng.random()) / log_failure)
+    raise ValueError(f"Unknown cart size distribution: {distribution}")
+
+
+def insert_batches(engine: Engine, table: Table, rows: Iterable[dict], batch_size: int) -> int:
+    """Insert rows with one executemany per batch, committing each batch."""
+    rows = iter(rows)
+    inserted = 0
+    while batch := list(islice(rows, batch_size)):
+        with engine.begin() as conn:
+            conn.execute(table.insert(), batch)
+        inserted += len(batch)
+    return inserted
+
+
+def generate_items(count: int, fake: Faker, rng: random.Random, deleted_share: float) -> Iterator[dict]:
+    for item_id in range(1, count + 1):
+        yield {
+            "id": item_id,
+            "name": f"{fake.color_name()} {fake.word()}",
+            # Log-normal prices: many cheap items, a few expensive ones
+            "price": round(rng.lognormvariate(3.5, 1.0), 2),
+            "deleted": rng.random() < deleted_share,
+        }
+
+
+def generate_cart_items(
+        carts: int,
+        items: int,
+        cart_size: Callable[[], int],
+        max_quantity: int,
+        rng: random.Random
+    ) -> Iterator[dict]:
+    for cart_id in range(1, carts + 1):
+        size = min(cart_size(), items)
+        for item_id in rng.sample(range(1, items + 1), size):
+            yield {
+                "cart_id": cart_id,
+                "item_id": item_id,
+                "quantity": rng.randint(1, max_quantity),
+            }
+
+
+def sync_id_sequences(conn: Connection, tables: Iterable[Table]) -> None:
+    """
+    Move id sequences past rows inserted with explicit ids.
+
+    Only Postgres needs it, SQLite takes the next id from the table itself.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    for table in tables:
+        last_id = select(func.max(table.c.id)).scalar_subquery()
+        conn.execute(select(func.setval(
+            func.pg_get_serial_sequence(table.name, "id"),
+            func.coalesce(last_id, 1),
+            last_id.is_not(None)
+        )))
+
+
+def generate_database(
+        engine: Engine,
+        items: int,
+        carts: int,
+        cart_size: float = 5,
+        distribution: str = "geometric",
+        max_quantity: int = 5,
+        deleted_share: float = 0.05,
+        batch_size: int = 10_000,
+        seed: int = 0
+    ) -> dict[str, int]:
+    """
+    Fill an empty schema with generated items, carts and cart lines.
+
+    The same seed always produces the same data. Ids are assigned here so
+    cart lines can refer to them. Cart totals are computed in one UPDATE
+    once every line is in place.
+    """
+    rng = random.Random(seed)
+    fake = Faker()
+    fake.seed_instance(seed)
+
+    counts = {
+        "items": insert_batches(
+            engine, ItemModel.__table__,
+            generate_items(items, fake, rng, deleted_share), batch_size
+        ),
+        "carts": insert_batches(
+            engine, CartModel.__table__,
+            ({"id": cart_id} for cart_id in range(1, carts + 1)), batch_size
+        ),
+        "cart_items": insert_batches(
+            engine, CartItemModel.__table__,
+            generate_cart_items(
+                carts, items, cart_size_sampler(distribution, cart_size, rng), max_quantity, rng
+            ),
+            batch_size
+        ),
+    }
+    with engine.begin() as conn:
+        conn.execute(cart_totals_update())
+        sync_id_sequences(conn, [ItemModel.__table__, CartModel.__table__])
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed the shop database.")
+    parser.add_argument("--items", type=int, help="generate this many items instead of the sample catalog")
+    parser.add_argument("--carts", type=int, default=0)
+    parser.add_argument("--cart-size", type=float, default=5, help="mean number of lines per cart")
+    parser.add_argument("--distribution", choices=CART_SIZE_DISTRIBUTIONS, default="geometric")
+    parser.add_argument("--max-quantity", type=int, default=5)
+    parser.add_argument("--deleted-share", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.items is None:
+        asyncio.run(seed_database())
+        return
+
+    reset_database()
+    started = time.perf_counter()
+    counts = generate_database(
+        engine,
+        items=args.items,
+        carts=args.carts,
+        cart_size=args.cart_size,
+        distribution=args.distribution,
+        max_quantity=args.max_quantity,
+        deleted_share=args.deleted_share,
+        batch_size=args.batch_size,
+        seed=args.seed,
+    )
+    elapsed = time.perf_counter() - started
+    print(", ".join(f"{count} {table}" for table, count in counts.items()) + f" in {elapsed:.1f}s")
 
 
 if __name__ == "__main__":
-    seed_database()
+    main()
@@ -1,9 +1,10 @@
 from fastapi import FastAPI
 from api.router import router as api_router
-from db.database import engine, Base
+from db.database import engine
+from db.migrations import migrate
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Create database tables and bring existing ones up to date
+migrate(engine)
 
 # Create the FastAPI app
 app = FastAPI(title="Shop API")
@@ -0,0 +1,806 @@
+import asyncio
+import random
+import statistics
+from contextlib import contextmanager
+from http import HTTPStatus
+from typing import Any, Awaitable, Iterator
+
+import pytest
+import httpx
+from faker import Faker
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import create_engine, create_mock_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import api.item
+from api.cache import InMemoryBackend, ModelCache
+from api.pagination import NEXT_CURSOR_HEADER
+from api.schemas.cart import (
+    MAX_QUANTITY, CartItem, CartItemRow, CartList, CartRow, CartWithItems
+)
+from api.schemas.item import ItemInDB, ItemRow
+from db.database import (
+    CartModel, ItemModel, async_database_url, async_engine, engine, engine_options
+)
+from db.models.item import find_item
+from db.migrations import migrate
+from db.seed_db import cart_size_sampler, generate_database, sync_id_sequences
+from main import app
+
+client = TestClient(app)
+faker = Faker()
+
+
+def query_plan(statement: str, parameters: tuple) -> str:
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+@contextmanager
+def count_queries() -> Iterator[list[tuple[str, tuple]]]:
+    """Collect every SQL statement sent to the database inside the block, with its parameters."""
+    queries: list[tuple[str, tuple]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        queries.append((statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+def run_async(awaitable: Awaitable[Any]) -> Any:
+    """Run on a fresh event loop, then drop the pool that got bound to it."""
+    async def main() -> Any:
+        try:
+            return await awaitable
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture()
+def new_items() -> list[int]:
+    return [
+        client.post(
+            "/item",
+            json={"name": faker.word(), "price": faker.pyfloat(min_value=1.0, max_value=100.0)},
+        ).json()["id"]
+        for _ in range(5)
+    ]
+
+
+def make_cart(item_ids: list[int]) -> int:
+    cart_id = client.post("/cart").json()["id"]
+    for item_id in item_ids:
+        client.post(f"/cart/{cart_id}/add/{item_id}")
+    return cart_id
+
+
+def test_get_cart_query_count_does_not_depend_on_items(new_items: list[int]):
+    small_cart = make_cart(new_items[:1])
+    large_cart = make_cart(new_items)
+
+    with count_queries() as small:
+        assert client.get(f"/cart/{small_cart}").status_code == HTTPStatus.OK
+    with count_queries() as large:
+        response = client.get(f"/cart/{large_cart}")
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()["items"]) == len(new_items)
+    assert len(large) == len(small) <= 2
+
+
+def test_list_carts_query_count_does_not_depend_on_page_size(new_items: list[int]):
+    for _ in range(5):
+        make_cart(new_items)
+
+    with count_queries() as one_cart:
+        assert client.get("/cart", params={"limit": 1}).status_code == HTTPStatus.OK
+    with count_queries() as many_carts:
+        response = client.get("/cart", params={"limit": 100})
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()) >= 5
+    assert len(many_carts) == len(one_cart)
+
+
+def test_cart_totals_follow_item_changes():
+    first = client.post("/item", json={"name": "first", "price": 10.0}).json()["id"]
+    second = client.post("/item", json={"name": "second", "price": 2.5}).json()["id"]
+    cart_id = make_cart([first, first, second])
+
+    cart = client.get(f"/cart/{cart_id}").json()
+    assert cart["price"] == pytest.approx(22.5)
+
+    client.patch(f"/item/{second}", json={"price": 5.0})
+    assert client.get(f"/cart/{cart_id}").json()["price"] == pytest.approx(25.0)
+
+    client.delete(f"/item/{first}")
+    assert client.get(f"/cart/{cart_id}").json()["price"] == pytest.approx(5.0)
+
+    carts = client.get("/cart", params={"min_price": 4.9, "max_price": 5.1, "limit": 1000}).json()
+    assert cart_id in {cart["id"] for cart in carts}
+
+
+def test_migrate_adds_and_backfills_cart_totals(tmp_path):
+    old_engine = create_engine(f"sqlite:///{tmp_path}/old.db")
+    with old_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE carts (id INTEGER PRIMARY KEY)"))
+        conn.execute(text(
+            "CREATE TABLE items (id INTEGER PRIMARY KEY, name VARCHAR, price FLOAT, deleted BOOLEAN)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE cart_items (cart_id INTEGER, item_id INTEGER, "
+            "quantity INTEGER, available BOOLEAN, PRIMARY KEY (cart_id, item_id))"
+        ))
+        conn.execute(text("INSERT INTO carts (id) VALUES (1), (2)"))
+        conn.execute(text("INSERT INTO items VALUES (1, 'a', 2.5, 0), (2, 'b', 100.0, 1)"))
+        conn.execute(text("INSERT INTO cart_items VALUES (1, 1, 3, 1), (1, 2, 1, 1)"))
+
+    migrate(old_engine)
+
+    with old_engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT id, total_price, total_quantity FROM carts ORDER BY id")
+        ).all()
+    assert rows == [(1, 7.5, 3), (2, 0.0, 0)]
+    assert "ix_carts_total_price" in {index["name"] for index in inspect(old_engine).get_indexes("carts")}
+
+
+@pytest.mark.parametrize("path", ["/item", "/cart"])
+def test_cursor_pagination_walks_every_row_once(path: str, new_items: list[int]):
+    make_cart(new_items)
+    expected = [row["id"] for row in client.get(path, params={"limit": 10_000}).json()]
+
+    seen = []
+    params = {"limit": 3}
+    while True:
+        response = client.get(path, params=params)
+        assert response.status_code == HTTPStatus.OK
+        seen.extend(row["id"] for row in response.json())
+        if NEXT_CURSOR_HEADER not in response.headers:
+            break
+        params["cursor"] = response.headers[NEXT_CURSOR_HEADER]
+
+    assert seen == expected == sorted(expected)
+
+
+@pytest.mark.parametrize("cursor", ["lol", "WzEsMl0", ""])
+def test_invalid_cursor(cursor: str):
+    response = client.get("/item", params={"cursor": cursor})
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.parametrize(
+    ("path", "sort"),
+    [("/item", "price"), ("/item", "-price"), ("/item", "-id"), ("/cart", "-total_price")],
+)
+def test_sorted_cursor_walk(path: str, sort: str, new_items: list[int]):
+    make_cart(new_items)
+    make_cart(new_items[:2])
+    rows = client.get(path, params={"limit": 10_000}).json()
+    key = (lambda row: row["id"]) if sort.endswith("id") else (lambda row: (row["price"], row["id"]))
+    expected = [row["id"] for row in sorted(rows, key=key, reverse=sort.startswith("-"))]
+
+    seen = []
+    params = {"limit": 3, "sort": sort}
+    while True:
+        response = client.get(path, params=params)
+        assert response.status_code == HTTPStatus.OK
+        seen.extend(row["id"] for row in response.json())
+        if NEXT_CURSOR_HEADER not in response.headers:
+            break
+        params["cursor"] = response.headers[NEXT_CURSOR_HEADER]
+
+    assert seen == expected
+
+
+@pytest.mark.parametrize(("path", "sort"), [("/item", "name"), ("/item", "total_price"), ("/cart", "price")])
+def test_invalid_sort(path: str, sort: str):
+    response = client.get(path, params={"sort": sort})
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.parametrize(
+    ("path", "params", "statement_prefix"),
+    [
+        ("/item", {"sort": "-price"}, "SELECT items."),
+        ("/item", {"sort": "price", "show_deleted": True}, "SELECT items."),
+        ("/cart", {"sort": "-total_price"}, "SELECT carts."),
+        ("/cart", {"sort": "total_quantity"}, "SELECT carts."),
+    ],
+)
+def test_sorted_listings_read_an_index(path: str, params: dict, statement_prefix: str, new_items: list[int]):
+    make_cart(new_items)
+    cursor = client.get(path, params={**params, "limit": 1}).headers[NEXT_CURSOR_HEADER]
+
+    with count_queries() as queries:
+        client.get(path, params={**params, "limit": 1, "cursor": cursor})
+
+    statement, parameters = next(
+        (statement, parameters) for statement, parameters in queries
+        if statement.startswith(statement_prefix)
+    )
+    plan = query_plan(statement, parameters)
+    assert "USING INDEX" in plan or "USING COVERING INDEX" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_list_carts_total_is_opt_in_and_cached():
+    with count_queries() as statements:
+        response = client.get("/cart")
+    assert isinstance(response.json(), list)
+    assert not any("count(" in statement.lower() for statement, _ in statements)
+
+    total = client.get("/cart", params={"with_total": True}).json()["total"]
+    with count_queries() as statements:
+        data = client.get("/cart", params={"with_total": True, "limit": 1}).json()
+    assert data["total"] == total
+    assert len(data["carts"]) == 1
+    assert not any("count(" in statement.lower() for statement, _ in statements)
+
+    client.post("/cart")
+    assert client.get("/cart", params={"with_total": True}).json()["total"] == total + 1
+    assert client.get(
+        "/cart", params={"with_total": True, "min_quantity": 10**9}
+    ).json() == {"carts": [], "total": 0}
+
+
+@pytest.mark.parametrize(
+    ("method", "path", "params", "statement_prefix", "index"),
+    [
+        ("GET", "/item", {"min_price": 1.0, "max_price": 2.0}, "SELECT items.", "ix_items_price_available"),
+        ("GET", "/cart", {"min_price": 1.0, "max_price": 2.0}, "SELECT carts.", "ix_carts_total_price"),
+        ("PATCH", "/item/{item_id}", {}, "UPDATE carts", "ix_cart_items_item_cart"),
+        ("PATCH", "/item/{item_id}", {}, "UPDATE carts", "ix_cart_items_cart_totals"),
+    ],
+)
+def test_filter_paths_use_indexes(
+    method: str,
+    path: str,
+    params: dict,
+    statement_prefix: str,
+    index: str,
+    new_items: list[int],
+):
+    make_cart(new_items)
+    path = path.format(item_id=new_items[0])
+
+    with count_queries() as queries:
+        client.request(method, path, params=params, json={"price": 2.0} if method == "PATCH" else None)
+
+    statement, parameters = next(
+        (statement, parameters) for statement, parameters in queries
+        if statement.startswith(statement_prefix)
+    )
+    plan = query_plan(statement, parameters)
+    assert f"USING INDEX {index}" in plan or f"USING COVERING INDEX {index}" in plan
+    assert not any(line.startswith("SCAN") for line in plan.splitlines())
+
+
+def test_concurrent_requests_share_the_event_loop(new_items: list[int]):
+    async def fetch_all() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(
+                async_client.get(f"/item/{item_id}")
+                for _ in range(20)
+                for item_id in new_items
+            ))
+
+    responses = run_async(fetch_all())
+
+    assert all(response.status_code == HTTPStatus.OK for response in responses)
+    assert [response.json()["id"] for response in responses] == new_items * 20
+
+
+@pytest.mark.parametrize("pragma", ["journal_mode", "busy_timeout"])
+def test_sqlite_connections_are_tuned(pragma: str):
+    async def read_pragma() -> Any:
+        async with async_engine.connect() as conn:
+            return (await conn.exec_driver_sql(f"PRAGMA {pragma}")).scalar()
+
+    expected = {"journal_mode": "wal", "busy_timeout": 5_000}
+    assert run_async(read_pragma()) == expected[pragma]
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql(f"PRAGMA {pragma}").scalar() == expected[pragma]
+
+
+@pytest.mark.parametrize("url", ["sqlite://", "sqlite:///:memory:", "sqlite:///{tmp_path}/file.db"])
+def test_sqlite_engines_accept_their_options(url: str, tmp_path):
+    url = url.format(tmp_path=tmp_path)
+    sync_engine = create_engine(url, **engine_options(url))
+    with sync_engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT 1").scalar() == 1
+    sync_engine.dispose()
+
+    # Options follow the async dialect's own pool class, which may differ
+    async_url = async_database_url(url)
+
+    async def select_one() -> Any:
+        scratch_engine = create_async_engine(async_url, **engine_options(async_url))
+        try:
+            async with scratch_engine.connect() as conn:
+                return (await conn.exec_driver_sql("SELECT 1")).scalar()
+        finally:
+            await scratch_engine.dispose()
+
+    assert asyncio.run(select_one()) == 1
+
+
+def test_concurrent_writers_do_not_lock(new_items: list[int]):
+    async def create_carts() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(async_client.post("/cart") for _ in range(50)))
+
+    responses = run_async(create_carts())
+
+    assert all(response.status_code == HTTPStatus.CREATED for response in responses)
+    assert len({response.json()["id"] for response in responses}) == 50
+
+
+def test_add_item_is_a_single_upsert(new_items: list[int]):
+    cart_id = make_cart([])
+
+    with count_queries() as statements:
+        response = client.post(f"/cart/{cart_id}/add/{new_items[0]}", params={"quantity": 3})
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["items"][0]["quantity"] == 3
+    statement, _ = statements[0]
+    assert statement.startswith("INSERT INTO cart_items")
+    assert "ON CONFLICT" in statement
+
+    response = client.post(f"/cart/{cart_id}/add/{new_items[0]}", params={"quantity": 2})
+    assert response.json()["items"][0]["quantity"] == 5
+
+
+@pytest.mark.parametrize(
+    ("cart", "item", "detail"),
+    [
+        ("missing", "existing", "Cart not found"),
+        ("existing", "missing", "Item not found"),
+        ("existing", "deleted", "Item not found"),
+    ],
+)
+def test_add_item_reports_missing_ids(cart: str, item: str, detail: str, new_items: list[int]):
+    cart_id = make_cart([]) if cart == "existing" else 10**9
+    item_id = 10**9 if item == "missing" else new_items[0]
+    if item == "deleted":
+        client.delete(f"/item/{item_id}")
+
+    response = client.post(f"/cart/{cart_id}/add/{item_id}")
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json()["detail"] == detail
+
+
+def test_concurrent_adds_are_not_lost(new_items: list[int]):
+    cart_id = make_cart([])
+
+    async def add_concurrently() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(
+                async_client.post(f"/cart/{cart_id}/add/{new_items[0]}")
+                for _ in range(30)
+            ))
+
+    responses = run_async(add_concurrently())
+
+    assert all(response.status_code == HTTPStatus.OK for response in responses)
+    cart = client.get(f"/cart/{cart_id}").json()
+    assert cart["items"][0]["quantity"] == 30
+    assert cart["price"] == pytest.approx(30 * cart["items"][0]["price"])
+
+
+def test_batch_create_items():
+    items = [{"name": f"batch {i}", "price": i + 0.5} for i in range(50)]
+
+    with count_queries() as statements:
+        response = client.post("/item/batch", json=items)
+
+    assert response.status_code == HTTPStatus.CREATED
+    created = response.json()
+    assert [{"name": item["name"], "price": item["price"]} for item in created] == items
+    assert len({item["id"] for item in created}) == len(items)
+    assert sum(statement.startswith("INSERT INTO items") for statement, _ in statements) == 1
+    assert client.get(f"/item/{created[-1]['id']}").json() == created[-1]
+
+
+@pytest.mark.parametrize("body", [[], [{"name": "no price"}], [{"name": "x", "price": -1}]])
+def test_batch_create_items_validation(body: list):
+    assert client.post("/item/batch", json=body).status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_batch_add_items_to_cart(new_items: list[int]):
+    cart_id = make_cart([new_items[0]])
+    lines = [
+        {"item_id": new_items[0], "quantity": 2},
+        {"item_id": new_items[1]},
+        {"item_id": new_items[1], "quantity": 4},
+    ]
+
+    response = client.post(f"/cart/{cart_id}/items", json=lines)
+
+    assert response.status_code == HTTPStatus.OK
+    quantities = {item["id"]: item["quantity"] for item in response.json()["items"]}
+    assert quantities == {new_items[0]: 3, new_items[1]: 5}
+    assert response.json()["price"] == pytest.approx(
+        sum(item["price"] * item["quantity"] for item in response.json()["items"])
+    )
+
+
+@pytest.mark.parametrize("quantity", [0, 2**31, 10**20])
+def test_add_item_quantity_bounds(quantity: int, new_items: list[int]):
+    cart_id = make_cart([])
+
+    response = client.post(f"/cart/{cart_id}/add/{new_items[0]}", params={"quantity": quantity})
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    lines = [{"item_id": new_items[0], "quantity": quantity}]
+    response = client.post(f"/cart/{cart_id}/items", json=lines)
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_summed_quantities_stay_in_range(new_items: list[int]):
+    cart_id = make_cart([])
+    lines = [{"item_id": new_items[0], "quantity": MAX_QUANTITY}, {"item_id": new_items[0]}]
+
+    response = client.post(f"/cart/{cart_id}/items", json=lines)
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+    for _ in range(2):
+        response = client.post(f"/cart/{cart_id}/items", json=lines[:1])
+        assert response.status_code == HTTPStatus.OK
+    assert response.json()["items"][0]["quantity"] == MAX_QUANTITY
+
+
+def test_batch_add_items_is_all_or_nothing(new_items: list[int]):
+    cart_id = make_cart([])
+    lines = [{"item_id": new_items[0]}, {"item_id": 10**9}]
+
+    response = client.post(f"/cart/{cart_id}/items", json=lines)
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert client.get(f"/cart/{cart_id}").json()["items"] == []
+
+    response = client.post("/cart/1000000000/items", json=lines[:1])
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json()["detail"] == "Cart not found"
+
+
+def test_get_item_is_served_from_cache(new_items: list[int]):
+    item_id = new_items[0]
+    first = client.get(f"/item/{item_id}").json()
+
+    with count_queries() as statements:
+        assert client.get(f"/item/{item_id}").json() == first
+    assert statements == []
+
+    client.patch(f"/item/{item_id}", json={"name": "renamed"})
+    assert client.get(f"/item/{item_id}").json()["name"] == "renamed"
+
+    client.put(f"/item/{item_id}", json={"name": "replaced", "price": 1.5})
+    assert client.get(f"/item/{item_id}").json()["name"] == "replaced"
+
+    client.delete(f"/item/{item_id}")
+    assert client.get(f"/item/{item_id}").status_code == HTTPStatus.NOT_FOUND
+
+
+def test_slow_cache_miss_does_not_store_a_stale_item(monkeypatch, new_items: list[int]):
+    item_id = new_items[0]
+    client.patch(f"/item/{item_id}", json={"price": 1.0})
+    read_done, updated = asyncio.Event(), asyncio.Event()
+
+    async def slow_find_item(item_id: int, db):
+        item = await find_item(item_id, db)
+        if not read_done.is_set():
+            read_done.set()
+            await updated.wait()
+        return item
+
+    monkeypatch.setattr(api.item, "find_item", slow_find_item)
+
+    async def scenario() -> list[float]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            miss = asyncio.create_task(http.get(f"/item/{item_id}"))
+            await read_done.wait()
+            await http.patch(f"/item/{item_id}", json={"price": 2.0})
+            updated.set()
+            stale = (await miss).json()["price"]
+            fresh = (await http.get(f"/item/{item_id}")).json()["price"]
+        return [stale, fresh]
+
+    assert run_async(scenario()) == [1.0, 2.0]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def snapshot(item_id: int, name: str = "item") -> ItemInDB:
+    return ItemInDB(id=item_id, name=name, price=1.0)
+
+
+def test_model_cache_ttl_and_size():
+    clock = FakeClock()
+    cache = ModelCache(ItemInDB, prefix="item", maxsize=2, ttl=10.0, clock=clock)
+
+    async def scenario():
+        for item_id in (1, 2):
+            await cache.set(item_id, snapshot(item_id))
+        assert await cache.get(1) == snapshot(1)
+
+        # 2 is the least recently used entry
+        await cache.set(3, snapshot(3))
+        assert await cache.get(2) is None
+        assert await cache.get(1) == snapshot(1)
+
+        clock.now = 10.0
+        assert await cache.get(1) is None
+        assert await cache.get(3) is None
+
+    asyncio.run(scenario())
+
+
+def test_model_cache_shared_backend_keeps_workers_coherent():
+    clock = FakeClock()
+    backend = InMemoryBackend(clock)
+    workers = [
+        ModelCache(ItemInDB, prefix="item", maxsize=10, ttl=60.0,
+                   backend=backend, local_ttl=1.0, clock=clock)
+        for _ in range(2)
+    ]
+
+    async def scenario():
+        await workers[0].set(1, snapshot(1))
+        assert await workers[1].get(1) == snapshot(1)
+
+        await workers[0].invalidate(1)
+        assert await workers[0].get(1) is None
+
+        # The other worker's local copy expires quickly, then it sees the miss
+        clock.now = 1.0
+        assert await workers[1].get(1) is None
+
+        await workers[1].set(1, snapshot(1, "renamed"))
+        assert await workers[0].get(1) == snapshot(1, "renamed")
+
+        clock.now = 61.0
+        assert await workers[0].get(1) is None
+
+    asyncio.run(scenario())
+
+
+def test_item_conditional_get(new_items: list[int]):
+    item_id = new_items[0]
+    response = client.get(f"/item/{item_id}")
+    etag = response.headers["etag"]
+    assert "last-modified" in response.headers
+
+    response = client.get(f"/item/{item_id}", headers={"If-None-Match": etag})
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+    client.patch(f"/item/{item_id}", json={"price": 42.0})
+    response = client.get(f"/item/{item_id}", headers={"If-None-Match": etag})
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["etag"] != etag
+    assert response.json()["price"] == 42.0
+    assert set(response.json()) == {"id", "name", "price", "deleted"}
+
+    response = client.get(
+        f"/item/{item_id}", headers={"If-Modified-Since": response.headers["last-modified"]}
+    )
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_cart_conditional_get_skips_loading_lines(new_items: list[int]):
+    cart_id = make_cart(new_items[:2])
+    etag = client.get(f"/cart/{cart_id}").headers["etag"]
+
+    with count_queries() as statements:
+        response = client.get(f"/cart/{cart_id}", headers={"If-None-Match": etag})
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert len(statements) == 1
+
+    # Changes to the cart and to its items both produce a new version
+    client.post(f"/cart/{cart_id}/add/{new_items[0]}")
+    response = client.get(f"/cart/{cart_id}", headers={"If-None-Match": etag})
+    assert response.status_code == HTTPStatus.OK
+    etag = response.headers["etag"]
+
+    client.patch(f"/item/{new_items[1]}", json={"name": "renamed"})
+    response = client.get(f"/cart/{cart_id}", headers={"If-None-Match": etag})
+    assert response.status_code == HTTPStatus.OK
+    assert "renamed" in {item["name"] for item in response.json()["items"]}
+
+
+def test_concurrent_item_writes_all_succeed(new_items: list[int]):
+    item_id = new_items[0]
+    etag = client.get(f"/item/{item_id}").headers["etag"]
+
+    async def write_concurrently() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            patches = await asyncio.gather(*(
+                async_client.patch(f"/item/{item_id}", json={"price": float(i + 1)})
+                for i in range(10)
+            ))
+            deletes = await asyncio.gather(*(
+                async_client.delete(f"/item/{item_id}") for _ in range(3)
+            ))
+            return patches + deletes
+
+    responses = run_async(write_concurrently())
+
+    assert [response.status_code for response in responses] == [HTTPStatus.OK] * 13
+    client.put(f"/item/{item_id}", json={"name": "restored", "price": 1.0})
+    assert client.get(f"/item/{item_id}").headers["etag"] != etag
+
+
+def test_item_list_etag_follows_table_changes():
+    params = {"limit": 5}
+    etag = client.get("/item", params=params).headers["etag"]
+
+    with count_queries() as statements:
+        response = client.get("/item", params=params, headers={"If-None-Match": f'W/{etag}, "x"'})
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert len(statements) == 1
+
+    other = client.get("/item", params={"limit": 6}).headers["etag"]
+    assert other != etag
+
+    client.post("/item", json={"name": "new", "price": 1.0})
+    response = client.get("/item", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == HTTPStatus.OK
+
+
+@pytest.mark.parametrize(
+    ("row", "model"),
+    [(ItemRow, ItemInDB), (CartItemRow, CartItem), (CartRow, CartWithItems)],
+)
+def test_response_rows_mirror_schemas(row: type, model: type[BaseModel]):
+    assert list(row.__annotations__) == list(model.model_fields)
+
+
+def test_row_responses_match_response_models(new_items: list[int]):
+    make_cart(new_items)
+
+    items = client.get("/item", params={"limit": 5}).json()
+    assert TypeAdapter(list[ItemInDB]).validate_python(items)
+    carts = client.get("/cart", params={"limit": 5}).json()
+    assert TypeAdapter(list[CartWithItems]).validate_python(carts)
+    page = client.get("/cart", params={"limit": 5, "with_total": True}).json()
+    assert CartList.model_validate(page).carts == TypeAdapter(list[CartWithItems]).validate_python(carts)
+
+
+@pytest.fixture()
+def searchable_items() -> dict:
+    # A random word keeps the results independent of other tests' items
+    token = faker.pystr(min_chars=12, max_chars=12).lower()
+    names = {
+        "exact": f"{token}",
+        "prefix": f"{token}suffix widget",
+        "other": f"gadget {token}zz",
+    }
+    return {
+        key: client.post("/item", json={"name": name, "price": price}).json()["id"]
+        for (key, name), price in zip(names.items(), [5.0, 10.0, 20.0])
+    } | {"token": token}
+
+
+def search(q: str, **params) -> list[int]:
+    response = client.get("/item/search", params={"q": q, **params})
+    assert response.status_code == HTTPStatus.OK
+    return [item["id"] for item in response.json()]
+
+
+def test_search_matches_prefixes(searchable_items: dict):
+    token = searchable_items["token"]
+    ids = {searchable_items[key] for key in ("exact", "prefix", "other")}
+
+    assert set(search(token)) == ids
+    assert set(search(token[:6].upper())) == ids
+    assert search(f"{token} widget") == [searchable_items["prefix"]]
+    assert search(f"{token} wid") == [searchable_items["prefix"]]
+    assert search(f'{token}" OR "x') == []
+
+
+def test_search_composes_with_filters(searchable_items: dict):
+    token = searchable_items["token"]
+
+    assert set(search(token, min_price=8.0, max_price=15.0)) == {searchable_items["prefix"]}
+
+    client.delete(f"/item/{searchable_items['exact']}")
+    assert searchable_items["exact"] not in search(token)
+    assert searchable_items["exact"] in search(token, show_deleted=True)
+
+
+def test_search_follows_renames(searchable_items: dict):
+    token = searchable_items["token"]
+    item_id = searchable_items["other"]
+
+    client.patch(f"/item/{item_id}", json={"name": "renamed thing"})
+
+    assert item_id not in search(token)
+    assert item_id in search("renamed thing")
+
+
+def test_search_ranks_better_matches_first():
+    token = faker.pystr(min_chars=12, max_chars=12).lower()
+    weak = client.post("/item", json={"name": f"{token} with many other words in name", "price": 1.0})
+    strong = client.post("/item", json={"name": f"{token} {token}", "price": 1.0})
+
+    assert search(token) == [strong.json()["id"], weak.json()["id"]]
+
+
+@pytest.mark.parametrize("q", ["", "  ", "***"])
+def test_search_rejects_empty_queries(q: str):
+    assert client.get("/item/search", params={"q": q}).status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def generated_database(tmp_path, name: str, **options) -> list[list[tuple]]:
+    """Generate into a scratch database and return the rows of every table."""
+    scratch = create_engine(f"sqlite:///{tmp_path}/{name}.db")
+    migrate(scratch)
+    generate_database(scratch, **options)
+    with scratch.connect() as conn:
+        return [
+            conn.execute(text(f"SELECT * FROM {table} ORDER BY 1, 2")).all()
+            for table in ("items", "carts", "cart_items")
+        ]
+
+
+def test_generate_database_is_reproducible_and_consistent(tmp_path):
+    options = {"items": 50, "carts": 20, "cart_size": 3, "distribution": "fixed", "batch_size": 7}
+    items, carts, cart_items = generated_database(tmp_path, "first", **options)
+    first_items = [(row.id, row.name, row.price, row.deleted) for row in items]
+
+    items, carts, cart_items = generated_database(tmp_path, "second", **options)
+    assert [(row.id, row.name, row.price, row.deleted) for row in items] == first_items
+    assert len(items) == 50 and len(carts) == 20 and len(cart_items) == 60
+
+    prices = {row.id: row.price for row in items if not row.deleted}
+    for cart in carts:
+        lines = [line for line in cart_items if line.cart_id == cart.id]
+        assert cart.total_price == pytest.approx(
+            sum(line.quantity * prices.get(line.item_id, 0) for line in lines)
+        )
+
+
+def test_generated_ids_advance_postgres_sequences():
+    statements = []
+
+    def executor(sql, *args, **kwargs):
+        statements.append(str(sql.compile(dialect=mock.dialect)))
+
+    mock = create_mock_engine("postgresql://", executor)
+
+    sync_id_sequences(mock, [ItemModel.__table__, CartModel.__table__])
+
+    assert len(statements) == 2
+    assert all(statement.startswith("SELECT setval(pg_get_serial_sequence(") for statement in statements)
+    assert "max(carts.id)" in statements[1]
+
+
+@pytest.mark.parametrize("distribution", ["fixed", "uniform", "geometric"])
+def test_cart_size_sampler_mean(distribution: str):
+    sample = cart_size_sampler(distribution, 8, random.Random(0))
+    sizes = [sample() for _ in range(20_000)]
+
+    assert min(sizes) >= 0
+    assert statistics.mean(sizes) == pytest.approx(8, rel=0.05)